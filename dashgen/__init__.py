@@ -0,0 +1,13 @@
+"""Encodes DASH representation ladders and measures the quality of every segment.
+
+    plan = Plan(calculate_psnr=True, jobs=4)
+    plan.add(Source("tos.y4m"), Ladder([Rung("vp9", crf=40), Rung("vp9", crf=50)], segment_size=10))
+    results = run(plan)
+"""
+
+from .ladder import Codec, Ladder, Plan, Rung, Source, load_plan, plan_from_spec, register_codec
+from .pipeline import Run, run
+from .store import load_results
+
+__all__ = ["Codec", "Ladder", "Plan", "Rung", "Run", "Source", "load_plan", "load_results", "plan_from_spec",
+           "register_codec", "run"]
@@ -0,0 +1,380 @@
+import base64
+import collections
+import contextlib
+import itertools
+import os
+import subprocess
+import threading
+import time
+import uuid
+
+from .profile import job_name
+from .workqueue import WorkQueue
+
+# one-shot container per command, the original behaviour
+docker_commands = {
+    "ffmpeg": "docker run --rm -v {current_dir}:/media -u $(id -u):$(id -g) jrottenberg/ffmpeg:3.2 ",
+    "ffprobe": "docker run --rm --entrypoint='ffprobe' -v {current_dir}:/media -u $(id -u):$(id -g) jrottenberg/ffmpeg:3.2 ",
+    "vmaf": "docker run --rm -i -v {current_dir}:/files vmaf run_vmaf ",
+}
+# long-lived containers kept idle, commands are run inside them with docker exec
+pool_container_commands = {
+    "ffmpeg": "docker run -d --rm --entrypoint='tail' -v {current_dir}:/media -u $(id -u):$(id -g) "
+              "jrottenberg/ffmpeg:3.2 -f /dev/null",
+    "ffprobe": "docker run -d --rm --entrypoint='tail' -v {current_dir}:/media -u $(id -u):$(id -g) "
+               "jrottenberg/ffmpeg:3.2 -f /dev/null",
+    "vmaf": "docker run -d --rm --entrypoint='tail' -v {current_dir}:/files vmaf -f /dev/null",
+}
+pool_exec_commands = {
+    "ffmpeg": "docker exec {container} ffmpeg ",
+    "ffprobe": "docker exec {container} ffprobe ",
+    "vmaf": "docker exec -i {container} run_vmaf ",
+}
+pool_stop_command = "docker rm -f {containers}"
+# binaries installed on the host
+native_commands = {
+    "ffmpeg": "ffmpeg ",
+    "ffprobe": "ffprobe ",
+    "vmaf": "run_vmaf ",
+}
+container_media = {"ffmpeg": "/media", "ffprobe": "/media", "vmaf": "/files"}
+
+
+def wait_with_usage(process):
+    """Waits for a process, returns its exit code and the resources used by it and the children it waited for."""
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return process.returncode, usage
+
+
+class Backend(object):
+    """Runs ffmpeg, ffprobe and vmaf command lines and keeps track of their timings.
+
+    Subclasses provide the command prefix for a tool and where the working
+    directory is seen by it (``media``).
+    """
+
+    name = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commands = []
+        self.startups = []
+        self.overhead = 0.0
+        self.version = None
+        # a Profiler recording every command, set by the run
+        self.profiler = None
+        # key of the job running on the calling thread, set by the run
+        self.current_job = lambda: None
+
+    def media(self, tool, current_dir):
+        return container_media[tool]
+
+    def acquire(self, tool, current_dir):
+        return None
+
+    def release(self, tool, current_dir, container):
+        pass
+
+    def prefix(self, tool, current_dir, container):
+        raise NotImplementedError
+
+    def run(self, tool, arguments, current_dir, quiet=False):
+        container = self.acquire(tool, current_dir)
+        try:
+            command_string = self.prefix(tool, current_dir, container) + arguments
+            if not quiet:
+                print("Running: %s" % command_string)
+            start = time.time()
+            process = subprocess.Popen(command_string, shell=True, stdout=subprocess.PIPE)
+            with process.stdout:
+                result = process.stdout.read()
+            return_code, usage = wait_with_usage(process)
+            self.record(tool, command_string, start, usage)
+            if return_code:
+                raise subprocess.CalledProcessError(return_code, command_string, result)
+            return result
+        finally:
+            self.release(tool, current_dir, container)
+
+    @contextlib.contextmanager
+    def stream(self, tool, arguments, current_dir):
+        """Runs a command and yields its stdout as a pipe, the command must be read to the end."""
+        container = self.acquire(tool, current_dir)
+        try:
+            command_string = self.prefix(tool, current_dir, container) + arguments
+            print("Streaming: %s" % command_string)
+            start = time.time()
+            process = subprocess.Popen(command_string, shell=True, stdout=subprocess.PIPE)
+            try:
+                yield process.stdout
+            finally:
+                process.stdout.close()
+                return_code, usage = wait_with_usage(process)
+                self.record(tool, command_string, start, usage)
+            if return_code:
+                raise subprocess.CalledProcessError(return_code, command_string)
+        finally:
+            self.release(tool, current_dir, container)
+
+    def record(self, tool, command_string, start, usage):
+        end = time.time()
+        with self.lock:
+            self.commands.append((tool, end - start))
+        if self.profiler:
+            self.profiler.command(tool, command_string, start, end, usage)
+
+    def measure_overhead(self, current_dir):
+        # a no-op command costs what every job pays before doing any work
+        self.version = self.run("ffmpeg", "-version", current_dir, quiet=True).decode().splitlines()[0]
+        start = time.time()
+        self.run("ffmpeg", "-version", current_dir, quiet=True)
+        self.overhead = time.time() - start
+        with self.lock:
+            del self.commands[-2:]
+        return self.overhead
+
+    def stop(self):
+        pass
+
+    def report(self):
+        command_time = sum(duration for _, duration in self.commands)
+        print("\n-----")
+        print("Backend: %s" % self.name)
+        print("Commands: %d, %.2fs" % (len(self.commands), command_time))
+        for tool in sorted(set(tool for tool, _ in self.commands)):
+            durations = [duration for name, duration in self.commands if name == tool]
+            print("  %s: %d, %.2fs" % (tool, len(durations), sum(durations)))
+        print("Container startups: %d, %.2fs" % (len(self.startups), sum(self.startups)))
+        print("Startup overhead per job: %.3fs (%.2fs in total, %.1f%% of command time)"
+              % (self.overhead, self.overhead * len(self.commands),
+                 100.0 * self.overhead * len(self.commands) / command_time if command_time else 0.0))
+
+
+class DockerBackend(Backend):
+    """A fresh `docker run --rm` container for every command."""
+
+    name = "docker"
+
+    def prefix(self, tool, current_dir, container):
+        return docker_commands[tool].format(current_dir=current_dir)
+
+    def report(self):
+        # every command starts its own container
+        self.startups = [self.overhead] * len(self.commands)
+        super(DockerBackend, self).report()
+
+
+class ContainerPoolBackend(Backend):
+    """A pool of long-lived containers reached with `docker exec`.
+
+    Containers are started on demand, up to ``size`` per image and mounted
+    directory, and removed when the run stops. A command goes to the least busy
+    container; containers are shared rather than leased, so a job streaming from
+    several commands at once cannot starve the pool.
+    """
+
+    name = "pool"
+
+    def __init__(self, size):
+        super(ContainerPoolBackend, self).__init__()
+        self.size = max(1, size)
+        # container command -> [container id, running commands, started event]
+        self.pools = collections.defaultdict(list)
+        self.containers = []
+
+    def acquire(self, tool, current_dir):
+        container_command = pool_container_commands[tool].format(current_dir=current_dir)
+        with self.lock:
+            pool = self.pools[container_command]
+            entry = min(pool, key=lambda item: item[1]) if pool else None
+            start = entry is None or (entry[1] and len(pool) < self.size)
+            if start:
+                entry = [None, 0, threading.Event()]
+                pool.append(entry)
+            entry[1] += 1
+        if not start:
+            entry[2].wait()
+            if entry[0] is None:
+                raise RuntimeError("Container could not be started: %s" % container_command)
+            return entry
+
+        print("Starting container: %s" % container_command)
+        start_time = time.time()
+        try:
+            entry[0] = subprocess.check_output(container_command, shell=True).decode().strip()
+        finally:
+            entry[2].set()
+        with self.lock:
+            self.startups.append(time.time() - start_time)
+            self.containers.append(entry[0])
+        if self.profiler:
+            self.profiler.startup(container_command, start_time, time.time())
+        return entry
+
+    def release(self, tool, current_dir, container):
+        with self.lock:
+            container[1] -= 1
+
+    def prefix(self, tool, current_dir, container):
+        return pool_exec_commands[tool].format(container=container[0])
+
+    def stop(self):
+        if self.containers:
+            subprocess.call(pool_stop_command.format(containers=" ".join(self.containers)), shell=True,
+                            stdout=subprocess.DEVNULL)
+            self.containers = []
+
+
+class NativeBackend(Backend):
+    """Local ffmpeg, ffprobe and run_vmaf binaries, no containers."""
+
+    name = "native"
+
+    def media(self, tool, current_dir):
+        return current_dir
+
+    def prefix(self, tool, current_dir, container):
+        return native_commands[tool]
+
+
+class QueueBackend(Backend):
+    """Commands run by worker processes, on this host or many others, through a shared WorkQueue.
+
+    ``backend`` is the one the workers run the commands with, the paths of the
+    commands (``media``) are the ones it sees. Commands whose output is streamed
+    to the run are run here with it. A lease without a heartbeat for
+    ``lease_timeout`` seconds is put back in the queue, up to ``max_attempts``
+    attempts; commands that fail are not retried.
+    """
+
+    name = "queue"
+
+    def __init__(self, directory, backend, lease_timeout=30, max_attempts=3):
+        super(QueueBackend, self).__init__()
+        self.queue = WorkQueue(directory)
+        self.backend = backend
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        # the tasks of the run are named after it, other runs can share the queue
+        self.run_id = uuid.uuid4().hex[:12]
+        self.counter = itertools.count()
+        # task name -> [done event, result, attempt]
+        self.waiting = {}
+        # when each lease was first seen, a lease is never older than its claim
+        self.leases_seen = {}
+        self.requeued = 0
+        self.workers = collections.Counter()
+        self.stopping = threading.Event()
+        self.monitor = None
+        self.warned = False
+
+    def media(self, tool, current_dir):
+        return self.backend.media(tool, current_dir)
+
+    def start_monitor(self):
+        with self.lock:
+            if self.monitor is None:
+                self.monitor = threading.Thread(target=self.watch, name="queue-monitor")
+                self.monitor.daemon = True
+                self.monitor.start()
+        if not self.warned and not self.queue.workers(self.lease_timeout):
+            self.warned = True
+            print("No worker on %s yet, waiting for one (python -m dashgen.worker %s)" % (self.queue.directory,
+                                                                                         self.queue.directory))
+
+    def run(self, tool, arguments, current_dir, quiet=False):
+        self.start_monitor()
+        key = self.current_job()
+        name = "%.6f-%s-%06d.json" % (time.time(), self.run_id, next(self.counter))
+        entry = [threading.Event(), None, 1]
+        with self.lock:
+            self.waiting[name] = entry
+        if not quiet:
+            print("Queueing: %s %s" % (tool, arguments))
+        start = time.time()
+        self.queue.submit(name, dict(run=self.run_id, job=key and job_name(key), stage=key and key[0], tool=tool,
+                                     arguments=arguments, directory=current_dir, backend=self.backend.name,
+                                     attempt=1, submitted=start))
+        entry[0].wait()
+        result = entry[1]
+        command_string = "%s %s" % (tool, arguments)
+        if result.get("lost"):
+            raise RuntimeError("Lease lost %d times, no worker completed: %s" % (self.max_attempts, command_string))
+        end = time.time()
+        with self.lock:
+            self.commands.append((tool, end - start))
+            self.workers[result["worker"]] += 1
+        if self.profiler and result.get("usage"):
+            self.profiler.worker_command(tool, command_string, start, end, result["worker"], result["usage"])
+        output = base64.b64decode(result["output"])
+        if result["return_code"]:
+            raise subprocess.CalledProcessError(result["return_code"], command_string, output)
+        return output
+
+    def stream(self, tool, arguments, current_dir):
+        self.backend.profiler = self.profiler
+        return self.backend.stream(tool, arguments, current_dir)
+
+    def resolve(self, name, result):
+        with self.lock:
+            entry = self.waiting.pop(name, None)
+        # a copy queued again after a lost lease is not run once the task is done
+        self.queue.cancel(name)
+        if entry is not None:
+            entry[1] = result
+            entry[0].set()
+
+    def watch(self):
+        while not self.stopping.wait(0.1):
+            for name in self.queue.names("results", self.run_id):
+                result = self.queue.take_result(name)
+                if result is not None:
+                    self.resolve(name, result)
+            now = time.time()
+            leases = self.queue.leases(self.run_id)
+            self.leases_seen = dict((name, self.leases_seen.get(name, now)) for name, _ in leases)
+            for name, heartbeat in leases:
+                if now - max(heartbeat, self.leases_seen[name]) < self.lease_timeout:
+                    continue
+                with self.lock:
+                    entry = self.waiting.get(name)
+                if entry is None:
+                    self.queue.cancel(name)
+                    continue
+                self.requeued += 1
+                entry[2] += 1
+                if entry[2] > self.max_attempts:
+                    self.resolve(name, dict(lost=True))
+                elif self.queue.requeue(name, entry[2]) is not None:
+                    print("Lease of %s expired, queued again (attempt %d)" % (name, entry[2]))
+                    del self.leases_seen[name]
+
+    def stop(self):
+        self.stopping.set()
+        if self.monitor is not None:
+            self.monitor.join()
+        # tasks of an interrupted run are not left to the workers
+        with self.lock:
+            names = list(self.waiting)
+        for name in names:
+            self.queue.cancel(name)
+        self.backend.stop()
+
+    def report(self):
+        super(QueueBackend, self).report()
+        print("Workers: %s" % ", ".join("%s (%d)" % (worker, count) for worker, count in sorted(self.workers.items())))
+        print("Expired leases: %d" % self.requeued)
+
+
+backends = {
+    "docker": DockerBackend,
+    "pool": ContainerPoolBackend,
+    "native": NativeBackend,
+}
+
+
+def create_backend(name, size):
+    if name == "pool":
+        return ContainerPoolBackend(size)
+    return backends[name]()
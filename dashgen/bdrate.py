@@ -0,0 +1,72 @@
+"""Bjontegaard deltas between the rate-quality curves of two codecs, VCEG-M33 style."""
+import math
+
+
+def fit(xs, ys, degree):
+    """Least squares polynomial, its coefficients from the constant term up."""
+    # normal equations solved by Gauss-Jordan elimination, curves only have a handful of points
+    size = degree + 1
+    rows = [[sum(x ** (row + column) for x in xs) for column in range(size)] +
+            [sum(y * x ** row for x, y in zip(xs, ys))] for row in range(size)]
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(rows[row][column]))
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(size):
+            if row != column:
+                factor = rows[row][column] / rows[column][column]
+                rows[row] = [value - factor * other for value, other in zip(rows[row], rows[column])]
+    return [rows[row][size] / rows[row][row] for row in range(size)]
+
+
+def curve_average(xs, ys, low, high):
+    """Average over [low, high] of the polynomial fitted to the points, a cubic from four points on."""
+    # centered, quality values to the sixth power are in the normal equations
+    center = sum(xs) / float(len(xs))
+    coefficients = fit([x - center for x in xs], ys, min(3, len(set(xs)) - 1))
+
+    def integral(x):
+        return sum(coefficient * (x - center) ** (power + 1) / (power + 1)
+                   for power, coefficient in enumerate(coefficients))
+    return (integral(high) - integral(low)) / (high - low)
+
+
+def overlap(anchor, test):
+    low = max(min(anchor), min(test))
+    high = min(max(anchor), max(test))
+    return (low, high) if high > low else None
+
+
+def usable(points):
+    # a curve needs two different rates and qualities
+    return len(set(rate for rate, _ in points)) > 1 and len(set(quality for _, quality in points)) > 1
+
+
+def bd_rate(anchor, test):
+    """Average bitrate difference in percent of ``test`` to ``anchor`` at the same quality.
+
+    Both curves are lists of (bitrate, quality) points, negative values are
+    savings. None when a curve has less than two points or when their quality
+    ranges do not overlap.
+    """
+    if not usable(anchor) or not usable(test):
+        return None
+    bounds = overlap([quality for _, quality in anchor], [quality for _, quality in test])
+    if bounds is None:
+        return None
+    anchor_rate, test_rate = [curve_average([quality for _, quality in points],
+                                            [math.log(rate) for rate, _ in points], *bounds)
+                              for points in (anchor, test)]
+    return (math.exp(test_rate - anchor_rate) - 1) * 100
+
+
+def bd_quality(anchor, test):
+    """Average quality difference of ``test`` to ``anchor`` at the same bitrate, None like ``bd_rate``."""
+    if not usable(anchor) or not usable(test):
+        return None
+    bounds = overlap([math.log(rate) for rate, _ in anchor], [math.log(rate) for rate, _ in test])
+    if bounds is None:
+        return None
+    anchor_quality, test_quality = [curve_average([math.log(rate) for rate, _ in points],
+                                                  [quality for _, quality in points], *bounds)
+                                    for points in (anchor, test)]
+    return test_quality - anchor_quality
@@ -0,0 +1,348 @@
+"""Benchmarks of the whole pipeline on synthetic sources.
+
+    python -m dashgen.benchmark --sources 360p:8 720p:8 -q 23 30 -psnr -j 4
+    python -m dashgen.benchmark --executor simulated --latency 0.05 -j 8 --baseline benchmarks.json --save
+
+Sources are ffmpeg test patterns generated locally. The ``ffmpeg`` executor runs
+every command with the local binaries, the ``simulated`` one answers them after
+a simulated latency without encoding anything, to measure the overhead of the
+scheduling alone.
+"""
+
+import argparse
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import random
+import re
+import resource
+import shlex
+import shutil
+import sys
+import tempfile
+import time
+
+from .backends import Backend, NativeBackend, native_commands
+from .cache import write_atomically
+from .commands import testsrc_command
+from .ladder import Ladder, Plan, Rung, Source, parse_resolution
+from .pipeline import Run
+
+
+def parse_clip(spec, rate=24):
+    """Reads a source spec such as 720p:10 or 1280x720:10, a resolution and a duration in seconds."""
+    resolution, _, duration = spec.partition(":")
+    width, height = parse_resolution(resolution)
+    # 16:9 by default, with an even width
+    width = width or int(round(height * 16 / 9.0 / 2)) * 2
+    return collections.OrderedDict([("name", "testsrc_%dx%d_%ss" % (width, height, duration or 10)),
+                                    ("width", width), ("height", height), ("rate", rate),
+                                    ("duration", float(duration or 10))])
+
+
+def digest(file_name):
+    # a stable pseudo-random number in [0, 1) for a file, whatever its directory
+    return int(hashlib.md5(os.path.basename(file_name).encode()).hexdigest()[:8], 16) / float(0x100000000)
+
+
+class SimulatedBackend(Backend):
+    """Answers the commands of the pipeline after a simulated latency, without running them.
+
+    Every command takes ``latency`` seconds, give or take ``jitter`` of it;
+    output files are written empty and metrics and packet sizes are derived from
+    the file names, so results are the same from one run to the next. Only the
+    encode segment mode with the ffmpeg PSNR engine, the files or libvmaf VMAF
+    engines and the single pass scoring is simulated.
+    """
+
+    name = "simulated"
+
+    def __init__(self, clips, latency=0.05, jitter=0.5, seed=0):
+        super(SimulatedBackend, self).__init__()
+        # clips by source base name
+        self.clips = clips
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+
+    def media(self, tool, current_dir):
+        return current_dir
+
+    def prefix(self, tool, current_dir, container):
+        return native_commands[tool]
+
+    def clip(self, file_name):
+        base_name = os.path.basename(file_name)
+        names = [name for name in self.clips if base_name.startswith(name)]
+        if not names:
+            raise ValueError("Not a synthetic source: %s" % file_name)
+        return self.clips[max(names, key=len)]
+
+    def run(self, tool, arguments, current_dir, quiet=False):
+        command_string = self.prefix(tool, current_dir, None) + arguments
+        if not quiet:
+            print("Running: %s" % command_string)
+        start = time.time()
+        with self.lock:
+            delay = self.latency * (1 + self.jitter * (2 * self.random.random() - 1))
+        time.sleep(max(0.0, delay))
+        result = self.answer(tool, arguments, shlex.split(arguments), current_dir)
+        # nothing ran, no resources were used
+        self.record(tool, command_string, start, resource.struct_rusage((0,) * 16))
+        return result
+
+    @contextlib.contextmanager
+    def stream(self, tool, arguments, current_dir):
+        raise ValueError("The simulated backend does not stream frames: %s" % arguments)
+        yield
+
+    def answer(self, tool, arguments, words, current_dir):
+        if "-version" in words:
+            return b"ffmpeg version 4.4-simulated"
+        if tool == "ffprobe":
+            return json.dumps(self.probe(words[-1], "-show_streams" in words)).encode()
+        if tool == "vmaf":
+            return json.dumps({"aggregate": {"VMAF_score": 60 + 40 * digest(words[4])}}).encode()
+        inputs = [words[index + 1] for index, word in enumerate(words[:-1]) if word == "-i"]
+        if "-f null -" in arguments and "split=" in arguments:
+            return self.scores(arguments, inputs[0])
+        if "-f null -" in arguments and "]psnr" in arguments:
+            return ("%.2f\n" % (30 + 20 * digest(inputs[1]))).encode()
+        if "-f null -" in arguments and "libvmaf" in arguments:
+            return json.dumps({"pooled_metrics": {"vmaf": {"mean": 60 + 40 * digest(inputs[0])}}}).encode()
+        outputs = [word for word in words if word.startswith(current_dir + os.sep) and word not in inputs]
+        if "-f" in words[words.index(inputs[-1]):] or not outputs:
+            raise ValueError("The simulated backend cannot run: %s" % arguments)
+        for output in outputs:
+            open(output, "wb").close()
+        return b""
+
+    def scores(self, arguments, segment):
+        # the summary lines of the psnr and ssim filters, and the log of libvmaf
+        value = digest(segment)
+        lines = []
+        if "]psnr" in arguments:
+            lines.append("PSNR y:%.2f u:%.2f v:%.2f average:%.2f min:0 max:0" % ((30 + 20 * value,) * 4))
+        if "]ssim" in arguments:
+            lines.append("SSIM Y:%.6f (0) U:%.6f (0) V:%.6f (0) All:%.6f (0)" % ((0.9 + value / 10,) * 4))
+        log = re.search(r"log_path=([^:\"]+)", arguments)
+        if log:
+            write_atomically(log.group(1), json.dumps({"pooled_metrics": {
+                "vmaf": {"mean": 60 + 40 * value}, "float_ms_ssim": {"mean": 0.95 + value / 20}}}))
+        return "\n".join(lines).encode()
+
+    def probe(self, file_name, streams):
+        clip = self.clip(file_name)
+        if streams:
+            return {"streams": [{"duration": "%.6f" % clip["duration"], "coded_width": clip["width"],
+                                 "coded_height": clip["height"]}], "format": {}}
+        # a keyframe every second, larger than the other frames
+        scale = digest(file_name)
+        frames = int(clip["duration"] * clip["rate"])
+        return {"packets": [collections.OrderedDict([
+            ("pts_time", "%.6f" % (frame / float(clip["rate"]))),
+            ("dts_time", "%.6f" % (frame / float(clip["rate"]))),
+            ("duration_time", "%.6f" % (1.0 / clip["rate"])),
+            ("size", str(int((4000 if frame % clip["rate"] == 0 else 1000) * (0.5 + scale))))])
+            for frame in range(frames)]}
+
+
+@contextlib.contextmanager
+def redirected_output(file_name):
+    # the prints of the run and the logs of the commands go to a file
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    with open(file_name, "ab") as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        for descriptor in saved:
+            os.close(descriptor)
+
+
+def generate_sources(clips, directory, executor):
+    """Writes the synthetic sources, ffmpeg test patterns or empty stand-ins for the simulated executor."""
+    backend = NativeBackend()
+    sources = []
+    for clip in clips:
+        file_name = os.path.join(directory, clip["name"] + ".y4m")
+        if not os.path.exists(file_name):
+            if executor == "simulated":
+                # never read, only the digest of the source is
+                write_atomically(file_name, "YUV4MPEG2 W%d H%d F%d:1 Ip A1:1 C420jpeg\n" % (
+                    clip["width"], clip["height"], clip["rate"]))
+            else:
+                print("Generating %s" % file_name)
+                backend.run("ffmpeg", testsrc_command.format(media=directory, video_file_name=clip["name"] + ".y4m",
+                                                             **clip), directory, quiet=True)
+        sources.append(file_name)
+    return sources
+
+
+def results_digest(results):
+    # the metric values of every source, metric and rung, whatever the directory of the run
+    values = dict((os.path.basename(path), dict((metric, dict((str(rung), segments)
+                                                              for rung, segments in rungs.items()))
+                                                for metric, rungs in metrics.items()))
+                  for path, metrics in results.items())
+    return hashlib.md5(json.dumps(values, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def measure(sources, clips, rungs, args, directory):
+    """Runs the plan once in ``directory``, returns its timings and throughput."""
+    plan = Plan(calculate_psnr=args.calculate_psnr, calculate_vmaf=args.calculate_vmaf,
+                calculate_ssim=args.calculate_ssim, calculate_ms_ssim=args.calculate_ms_ssim,
+                calculate_size=args.calculate_size, single_pass=args.single_pass, vmaf_engine=args.vmaf_engine,
+                jobs=args.jobs,
+                backend="simulated" if args.executor == "simulated" else "native",
+                cache_dir=os.path.join(directory, "cache"))
+    for file_name in sources:
+        plan.add(Source(file_name), Ladder(rungs, args.segment_size, args.frames_per_second))
+    backend = None
+    if args.executor == "simulated":
+        backend = SimulatedBackend(dict((clip["name"], clip) for clip in clips), args.latency, args.jitter)
+    run = Run(plan, backend)
+    working_directory = os.getcwd()
+    os.makedirs(directory)
+    os.chdir(directory)
+    try:
+        with redirected_output(os.path.join(directory, "run.log")):
+            start = time.time()
+            results = run.execute()
+            wall = time.time() - start
+    finally:
+        os.chdir(working_directory)
+    segments = sum(len(run.segments(source)) for source in plan.sources) * len(rungs)
+    frames = sum(int(source.duration * args.frames_per_second) for source in plan.sources) * len(rungs)
+    command_time = sum(duration for _, duration in run.backend.commands)
+    return collections.OrderedDict([
+        ("wall", wall),
+        ("segments", segments),
+        ("frames", frames),
+        ("segments_per_second", segments / wall),
+        ("frames_per_second", frames / wall),
+        ("commands", len(run.backend.commands)),
+        ("commands_per_second", len(run.backend.commands) / wall),
+        # share of the worker time spent in commands, what is left is scheduling and waiting
+        ("busy", command_time / (wall * args.jobs)),
+        ("ffmpeg", run.backend.version),
+        ("results", results_digest(results)),
+    ])
+
+
+def compare(current, baseline, threshold):
+    """Prints the change of every measure from the baseline, returns whether the run regressed."""
+    regressed = False
+    for name in ("wall", "segments_per_second", "frames_per_second", "commands_per_second", "busy"):
+        delta = 100.0 * (current[name] - baseline[name]) / baseline[name] if baseline[name] else 0.0
+        # the wall time regresses when it grows, the others when they drop
+        slower = delta > threshold if name == "wall" else delta < -threshold
+        regressed = regressed or (slower and name == "segments_per_second")
+        print("  %-20s %10.3f -> %10.3f  %+6.1f%%%s" % (name, baseline[name], current[name], delta,
+                                                        "  slower" if slower else ""))
+    if current["results"] != baseline["results"]:
+        print("  results differ from the baseline: %s -> %s" % (baseline["results"], current["results"]))
+        regressed = True
+    return regressed
+
+
+parser = argparse.ArgumentParser(description='Benchmark the DASH pipeline on synthetic sources')
+parser.add_argument('--executor', help='Run the commands with the local ffmpeg, or simulate them with a latency',
+                    choices=['ffmpeg', 'simulated'], default='ffmpeg')
+parser.add_argument('--sources', nargs='+', help='Synthetic sources as resolution:seconds (e.g. 720p:10 1280x720:10)',
+                    default=['360p:8', '720p:8'])
+parser.add_argument('-c', '--codec', help='Codec (ffmpeg)', type=str, default='libx264')
+parser.add_argument('-q', '--qualities', nargs='+', help='Encoding qualities(crf)', type=int, default=[23, 30])
+parser.add_argument('-ss', '--segment-size', help='Segment size(s)', type=int, default=2)
+parser.add_argument('-fps', '--frames-per-second', help='Frames per second', type=int, default=24)
+parser.add_argument('-psnr', '--calculate-psnr', action='store_true', help='Calculate PSNR')
+parser.add_argument('-vmaf', '--calculate-vmaf', action='store_true', help='Calculate VMAF')
+parser.add_argument('-ssim', '--calculate-ssim', action='store_true', help='Calculate SSIM')
+parser.add_argument('-msssim', '--calculate-ms-ssim', action='store_true', help='Calculate MS-SSIM')
+parser.add_argument('-size', '--calculate-size', action='store_true', help='Calculate the size and bitrate of every '
+                                                                         'segment')
+parser.add_argument('--single-pass', action='store_true', help='Compute every metric of a segment in a single pass')
+parser.add_argument('--vmaf-engine', help='VMAF engine, the simulated executor has no fifo engine',
+                    choices=['files', 'libvmaf', 'fifo'], default='files')
+parser.add_argument('-j', '--jobs', help='Number of commands run in parallel', type=int, default=1)
+parser.add_argument('--latency', help='Seconds taken by every simulated command', type=float, default=0.05)
+parser.add_argument('--jitter', help='Variation of the simulated latency, as a share of it', type=float, default=0.5)
+parser.add_argument('--repeat', help='Runs measured, the fastest one is kept', type=int, default=1)
+parser.add_argument('--directory', help='Directory of the sources and runs (default: a temporary directory, removed '
+                                        'afterwards)', type=str)
+parser.add_argument('--baseline', help='JSON file of stored benchmarks to compare with', type=str)
+parser.add_argument('--name', help='Name of the benchmark in the baseline file (default: from its options)', type=str)
+parser.add_argument('--save', action='store_true', help='Store this benchmark in the baseline file')
+parser.add_argument('--threshold', help='Drop of the segment throughput, in percent, reported as a regression',
+                    type=float, default=5.0)
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    if args.save and not args.baseline:
+        parser.error("--save needs --baseline")
+    clips = [parse_clip(spec, args.frames_per_second) for spec in args.sources]
+    rungs = [Rung(args.codec, crf=crf) for crf in args.qualities]
+    name = args.name or " ".join([args.executor] + args.sources + [str(rung) for rung in rungs] + [
+        "ss %d" % args.segment_size, "j %d" % args.jobs] + [
+        metric for metric, enabled in (("psnr", args.calculate_psnr), ("vmaf", args.calculate_vmaf),
+                                       ("ssim", args.calculate_ssim), ("ms_ssim", args.calculate_ms_ssim),
+                                       ("size", args.calculate_size), ("single pass", args.single_pass)) if enabled] + (
+        ["latency %g" % args.latency] if args.executor == "simulated" else []))
+    directory = os.path.abspath(args.directory or tempfile.mkdtemp(prefix="dashgen_benchmark_"))
+    print("Benchmark: %s" % name)
+    print("Directory: %s" % directory)
+    try:
+        if not os.path.isdir(os.path.join(directory, "sources")):
+            os.makedirs(os.path.join(directory, "sources"))
+        sources = generate_sources(clips, os.path.join(directory, "sources"), args.executor)
+        runs = []
+        for repeat in range(args.repeat):
+            run_directory = os.path.join(directory, "run%d" % (repeat + 1))
+            # every run starts without cache nor journal
+            shutil.rmtree(run_directory, ignore_errors=True)
+            runs.append(measure(sources, clips, rungs, args, run_directory))
+            print("Run %d: %.2fs" % (repeat + 1, runs[-1]["wall"]))
+    finally:
+        if not args.directory:
+            shutil.rmtree(directory, ignore_errors=True)
+    best = min(runs, key=lambda values: values["wall"])
+    if len(set(values["results"] for values in runs)) > 1:
+        print("Warning: the results changed from one run to the next")
+
+    print("\n-----")
+    print("Wall: %.2fs (fastest of %d)" % (best["wall"], len(runs)))
+    print("Segments: %d, %.2f segments/s" % (best["segments"], best["segments_per_second"]))
+    print("Frames: %d, %.1f frames/s" % (best["frames"], best["frames_per_second"]))
+    print("Commands: %d, %.1f commands/s, workers busy %.1f%% of the time" % (
+        best["commands"], best["commands_per_second"], 100.0 * best["busy"]))
+    print("Results: %s" % best["results"])
+
+    benchmarks = collections.OrderedDict()
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            benchmarks = json.load(file, object_pairs_hook=collections.OrderedDict)
+    regressed = False
+    if name in benchmarks:
+        print("Baseline: %s" % args.baseline)
+        regressed = compare(best, benchmarks[name], args.threshold)
+    elif args.baseline:
+        print("No baseline for this benchmark in %s" % args.baseline)
+    if args.save:
+        benchmarks[name] = best
+        write_atomically(args.baseline, json.dumps(benchmarks, indent=4, separators=(',', ': ')))
+        print("Saved to %s" % args.baseline)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+
+class ArtifactCache(object):
+    """Content-addressed store of intermediate files shared by runs.
+
+    Entries are named after a hash of everything that determines their content
+    and only ever appear complete: they are written to a temporary name and then
+    renamed. Entries are hard-linked (or copied when the cache is on another file
+    system) to and from the working files. When ``max_size`` is set, the least
+    recently used entries are removed to keep the cache under it.
+    """
+
+    def __init__(self, directory, max_size=None):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def fetch(self, key, destination):
+        """Restores the entry into ``destination``, returns False when it is not cached."""
+        try:
+            os.utime(self.path(key))
+            link_or_copy(self.path(key), destination)
+        except FileNotFoundError:
+            # not cached, or evicted by another run in the meantime
+            return False
+        return True
+
+    def publish(self, key, source):
+        os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+        link_or_copy(source, self.path(key))
+        if self.max_size:
+            self.evict()
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            for directory, _, file_names in os.walk(self.directory):
+                for file_name in file_names:
+                    if ".tmp-" in file_name or directory == self.directory:
+                        continue
+                    path = os.path.join(directory, file_name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size:
+                    break
+                print("Evicting cached file: %s" % path)
+                remove_files(path)
+                total_size -= size
+
+    def source_digest(self, file_name):
+        """Hashes the content of a source, remembering it by path, size and modification time."""
+        digests_file = os.path.join(self.directory, "sources.json")
+        stat = os.stat(file_name)
+        signature = [os.path.abspath(file_name), stat.st_size, stat.st_mtime_ns]
+        with self.lock:
+            try:
+                with open(digests_file) as file:
+                    digests = json.load(file)
+            except (FileNotFoundError, ValueError):
+                digests = {}
+        digest = digests.get(signature[0])
+        if digest and digest[:2] == signature[1:]:
+            return digest[2]
+
+        print("Hashing source: %s" % file_name)
+        sha = hashlib.sha256()
+        with open(file_name, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                sha.update(chunk)
+        digests[signature[0]] = signature[1:] + [sha.hexdigest()]
+        with self.lock:
+            write_atomically(digests_file, json.dumps(digests, sort_keys=True, indent=4))
+        return sha.hexdigest()
+
+
+def link_or_copy(source, destination):
+    if os.path.isfile(destination) and os.path.samefile(source, destination):
+        return
+    temporary = "%s.tmp-%s" % (destination, uuid.uuid4().hex)
+    try:
+        os.link(source, temporary)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(source, temporary)
+    os.replace(temporary, destination)
+
+
+def write_atomically(file_name, content):
+    temporary = "%s.tmp-%s" % (file_name, uuid.uuid4().hex)
+    with open(temporary, 'w') as file:
+        file.write(content)
+    os.replace(temporary, file_name)
+
+
+def remove_files(*file_names):
+    for file_name in file_names:
+        if os.path.lexists(file_name):
+            os.remove(file_name)
+
+
+def parse_size(size):
+    units = {"k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+    size = str(size).strip().lower().rstrip("b")
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
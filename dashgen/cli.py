@@ -0,0 +1,184 @@
+import argparse
+
+from .backends import backends
+from .ladder import Ladder, Plan, Rung, codecs, get_codec, load_plan, register_codec
+from .metrics import numpy
+from .pipeline import run
+
+parser = argparse.ArgumentParser(description='Generate DASH Video')
+group = parser.add_mutually_exclusive_group()
+
+parser.add_argument('video', nargs='?')
+group.add_argument('-q', '--qualities', nargs='+', help='Encoding qualities(crf)', type=int)
+group.add_argument('-b', '--bitrates', nargs='+', help='Encoding bitrates(as ffmpeg likes: 500kbps, 1M...)', type=str)
+parser.add_argument('-r', '--resolutions', nargs='+', help='Resolution of each quality or bitrate (1280x720, or a '
+                                                         'height such as 720p), the source resolution by default',
+                    type=str)
+parser.add_argument('--plan', help='JSON or YAML ladder spec of the sources to encode, used instead of the video, '
+                                   'rung and segment options', type=str)
+parser.add_argument('-c', '--codec', action='append', help='Codec (ffmpeg), repeated or comma separated to compare '
+                                                           'several codecs with the first one, e.g. -c libx264,libx265',
+                    type=str)
+parser.add_argument('--codec-options', nargs='+', metavar='CODEC=OPTIONS', help='Options added to every encode of a '
+                                                                                'codec, e.g. "libx265=-preset fast"',
+                    type=str)
+parser.add_argument('--codec-container', nargs='+', metavar='CODEC=EXTENSION', help='Container the encodes of a '
+                                                                                   'codec are written in, e.g. '
+                                                                                   '"librav1e=mp4", which adds the '
+                                                                                   'codecs the registry does not know',
+                    type=str)
+parser.add_argument('-ss', '--segment-size', help='Segment size(s)', type=int)
+parser.add_argument('-fps', '--frames-per-second', help='Frames per second', type=int, default=24)
+parser.add_argument('-psnr', '--calculate-psnr', action='store_true', help='Calculate PSNR')
+parser.add_argument('-vmaf', '--calculate-vmaf', action='store_true', help='Calculate VMAF')
+parser.add_argument('-ssim', '--calculate-ssim', action='store_true', help='Calculate SSIM')
+parser.add_argument('-msssim', '--calculate-ms-ssim', action='store_true', help='Calculate MS-SSIM (needs an ffmpeg '
+                                                                             'built with libvmaf)')
+parser.add_argument('-size', '--calculate-size', action='store_true', help='Calculate the size and bitrate of every '
+                                                                         'segment of the full-length encodes, and '
+                                                                         'the size of the segments encoded one by '
+                                                                         'one for the metrics')
+parser.add_argument('--single-pass', action='store_true', help='Compute every metric of a segment from a single '
+                                                                'decoding of it and of the reference, VMAF needs an '
+                                                                'ffmpeg built with libvmaf (implied by SSIM and '
+                                                                'MS-SSIM)')
+parser.add_argument('--psnr-engine', help='Compute PSNR with ffmpeg\'s psnr filter over raw .yuv reference segments, '
+                                          'or in-process with numpy over decoded frame pipes',
+                    choices=['ffmpeg', 'numpy'], default='ffmpeg')
+parser.add_argument('--psnr-chunk-frames', help='Frames read at once by the numpy PSNR engine', type=int, default=8)
+parser.add_argument('--vmaf-engine', help='Compute VMAF with run_vmaf over decoded .yuv files, with ffmpeg\'s libvmaf '
+                                          'filter, or with run_vmaf reading decoders through named pipes',
+                    choices=['files', 'libvmaf', 'fifo'], default='files')
+parser.add_argument('--metric-frame-step', help='Compute metrics on every Nth frame only', type=int, default=1)
+parser.add_argument('--metric-resolution', help='Compute metrics on copies downscaled to this resolution (e.g. 540p)',
+                    type=str)
+parser.add_argument('--calibration-segments', help='Segments also measured over every frame at the source '
+                                                   'resolution, to give the error interval of sampled metrics',
+                    type=int, default=2)
+parser.add_argument('--resume', action='store_true', help='Continue an interrupted run, reusing the results of '
+                                                            'its journal')
+parser.add_argument('--clean', action='store_true', help='Remove segment files')
+parser.add_argument('--scratch-budget', help='Disk space (e.g. 200G) the raw reference and decoded segments may take '
+                                             'at once, their decodes wait for space and they are removed after their '
+                                             'last reader and not cached (implies --clean)', type=str)
+parser.add_argument('--segment-mode', help='Encode every segment again from the source, or split the full-length '
+                                           'encode of each rung with a stream copy', choices=['encode', 'split'],
+                    default='encode')
+parser.add_argument('--segmentation', help='Segments of the segment size, or of variable length starting on the '
+                                           'scene cuts of the video', choices=['fixed', 'scenes'], default='fixed')
+parser.add_argument('--scene-threshold', help='Scene change score (0-1) of a scene cut', type=float, default=0.4)
+parser.add_argument('--min-segment-size', help='Shortest scene segment in seconds (default: half the segment size)',
+                    type=float)
+parser.add_argument('--max-segment-size', help='Longest scene segment in seconds (default: twice the segment size)',
+                    type=float)
+parser.add_argument('--decode-once', action='store_true', help='Decode the source once for every rung encode and '
+                                                                 'reference segment (implies --segment-mode split)')
+parser.add_argument('--package', action='store_true', help='Cut the encode of every rung into DASH init and media '
+                                                              'segments and write an MPD covering every rung')
+parser.add_argument('--results-store', action='store_true', help='Append every segment and frame value to a columnar '
+                                                                    'XXX_results.npys file (requires numpy)')
+parser.add_argument('--target-metric', help='Search, between the lowest and highest quality or bitrate given, the '
+                                            'rung reaching a target value of this metric instead of encoding them all',
+                    choices=['vmaf', 'psnr'])
+parser.add_argument('--target-value', help='Target VMAF or PSNR of the search', type=float)
+parser.add_argument('--target-tolerance', help='Distance to the target value that stops the search', type=float,
+                    default=0.5)
+parser.add_argument('--target-scope', help='Search a rung for every segment, or one for the whole video',
+                    choices=['segment', 'title'], default='segment')
+parser.add_argument('--max-probes', help='Encodes measured by a search at most', type=int, default=6)
+parser.add_argument('--cache-dir', help='Directory of the intermediate file cache, can be shared by runs and machines '
+                                        '(default: .dashgen_cache next to the video)', type=str)
+parser.add_argument('--cache-size', help='Maximum size of the cache (e.g. 500G), least recently used files are '
+                                         'removed first', type=str)
+parser.add_argument('-j', '--jobs', help='Number of commands run in parallel', type=int, default=1)
+parser.add_argument('--backend', help='How ffmpeg/ffprobe/vmaf are run: one-shot docker containers, a pool of '
+                                      'long-lived containers or local binaries', choices=sorted(backends),
+                    default='docker')
+parser.add_argument('--pool-size', help='Containers per image in the pool backend (default: jobs)', type=int)
+parser.add_argument('--queue-dir', help='Queue directory shared with workers (python -m dashgen.worker) that run the '
+                                        'commands with the backend, on a filesystem they all mount at the same path',
+                    type=str)
+parser.add_argument('--lease-timeout', help='Seconds without a heartbeat after which a command leased by a worker is '
+                                            'queued again', type=int, default=30)
+parser.add_argument('--max-attempts', help='Workers a command is given to at most when their leases expire',
+                    type=int, default=3)
+parser.add_argument('--profile', help='Write a Chrome trace (chrome://tracing, Perfetto) of every job and command '
+                                      'to this file, and print the time and resources of every stage',
+                    metavar='TRACE_FILE')
+
+
+# options of the whole run, given on the command line they take precedence over the ones of a ladder spec
+run_options = list(Plan.defaults)
+
+
+def codec_settings(values, option, metavar):
+    """(codec, value) of every CODEC=VALUE of a codec option."""
+    settings = []
+    for value in values or []:
+        if "=" not in value:
+            parser.error("%s takes %s, not %s" % (option, metavar, value))
+        settings.append(value.split("=", 1))
+    return settings
+
+
+def register_containers(containers):
+    for name, extension in containers:
+        known = codecs.get(name)
+        register_codec(name, extension, known.options if known else "")
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    containers = codec_settings(args.codec_container, "--codec-container", "CODEC=EXTENSION")
+    codec_options = codec_settings(args.codec_options, "--codec-options", "CODEC=OPTIONS")
+
+    options = dict((name, getattr(args, name)) for name in run_options)
+    codec_names = [name for value in args.codec or [] for name in value.split(",") if name]
+    try:
+        # codecs the registry does not know are added before the rungs using them
+        register_containers(containers)
+        if args.plan:
+            print("Plan: %s" % args.plan)
+            plan = load_plan(args.plan, **dict((name, value) for name, value in options.items()
+                                               if value != parser.get_default(name)))
+        else:
+            if not args.video or not codec_names or not args.segment_size:
+                parser.error("the video, -c/--codec and -ss/--segment-size are required without --plan")
+            print("Video file: %s" % args.video)
+            print("Codec: %s" % ", ".join(codec_names))
+            print("Qualities: %s" % args.qualities)
+            print("Segment Size: %d" % args.segment_size)
+            if not args.qualities and not args.bitrates:
+                print("Qualities of bitrates must be provided! Check help (-h) for more info")
+                exit(-1)
+            if args.target_metric and args.target_value is None:
+                parser.error("--target-metric needs --target-value")
+            if args.resolutions and len(args.resolutions) != len(args.qualities or args.bitrates):
+                parser.error("-r/--resolutions needs one resolution per quality or bitrate")
+            resolutions = args.resolutions or [None] * len(args.qualities or args.bitrates)
+            if args.qualities:
+                print("Encoding qualities....")
+                rungs = [Rung(codec, crf=crf, resolution=resolution)
+                         for codec in codec_names for crf, resolution in zip(args.qualities, resolutions)]
+            else:
+                print("Encoding bitrates....")
+                rungs = [Rung(codec, bitrate=bitrate, resolution=resolution)
+                         for codec in codec_names for bitrate, resolution in zip(args.bitrates, resolutions)]
+            plan = Plan(**options)
+            plan.add(args.video, Ladder(rungs, args.segment_size, args.frames_per_second))
+
+        # again after the ladder spec, whose codecs section they take precedence over
+        register_containers(containers)
+        for name, value in codec_options:
+            register_codec(name, get_codec(name).extension, value)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if plan.psnr_engine == "numpy" and numpy is None:
+        print("The numpy PSNR engine needs numpy installed (pip install numpy)")
+        exit(-1)
+    if plan.results_store and numpy is None:
+        print("The results store needs numpy installed (pip install numpy)")
+        exit(-1)
+
+    run(plan)
@@ -0,0 +1,188 @@
+"""ffmpeg, ffprobe and run_vmaf command templates, without the backend prefix."""
+
+encode_quality_output = \
+    "{scale}-c:v {codec} {codec_options}-crf {crf} -b:v 0 " \
+    "-g {gop_size} -keyint_min {gop_size} -sc_threshold 0 {key_frames}" \
+    "{media}/{video_base_name}_{codec}{size}_crf{crf}.{extension}"
+
+encode_quality_command = "-y -i {media}/{video_file_name} " + encode_quality_output
+
+encoded_quality_file = "{video_base_name}_{codec}{size}_crf{crf}.{extension}"
+
+encode_bitrate_output = \
+    "{scale}-c:v {codec} {codec_options}-b:v {bitrate} -maxrate {bitrate} -bufsize {bitrate} " \
+    "-g {gop_size} -keyint_min {gop_size} -sc_threshold 0 {key_frames}" \
+    "{media}/{video_base_name}_{codec}{size}_b{bitrate}.{extension}"
+
+encode_bitrate_command = "-y -i {media}/{video_file_name} " + encode_bitrate_output
+
+encoded_bitrate_file = "{video_base_name}_{codec}{size}_b{bitrate}.{extension}"
+
+# synthetic source of the benchmarks, ffmpeg's test pattern with a frame counter
+testsrc_command = "-y -f lavfi -i testsrc=size={width}x{height}:rate={rate}:duration={duration} " \
+                  "-pix_fmt yuv420p {media}/{video_file_name}"
+
+ffprobe_duration = "-v quiet -print_format json -show_format -show_streams {media}/{video_file_name}"
+
+# keyframes of the full-length encodes on the boundaries of variable length segments
+force_key_frames_option = "-force_key_frames {times} "
+
+# one decoding pass logging the time of every frame that starts a new scene, the log is parsed as it is
+# (a grep would fail the command when there is no cut, and hide the exit status of ffmpeg)
+scene_cuts_command = \
+    "-i {media}/{video_file_name} -an -vf \"select='gt(scene,{threshold})',showinfo\" -f null - 2>&1"
+scenes_file = "{video_base_name}_scenes.json"
+segments_file = "{video_base_name}_segments.json"
+
+# time and size of every video packet, read without decoding
+ffprobe_packets = \
+    "-v quiet -print_format json=compact=1 -select_streams v:0 " \
+    "-show_entries packet=pts_time,dts_time,duration_time,size {media}/{video_file_name}"
+
+encode_quality_segment_command = \
+    "-y -i {media}/{video_file_name} " \
+    "-ss {start_time} -t {duration} " \
+    "{scale}-c:v {codec} {codec_options}-crf {crf} -b:v 0 " \
+    "-g {gop_size} -keyint_min {gop_size} -sc_threshold 0 " \
+    "{media}/{video_base_name}_{codec}{size}_crf{crf}_{start_time_format}.{extension}"
+
+encode_quality_segment_from_yuv_segment_command = \
+    "-f rawvideo -pix_fmt yuv420p -s {width}x{height} " \
+    "-y -i {media}/{video_file_name} " \
+    "{scale}-c:v {codec} {codec_options}-crf {crf} -b:v 0 " \
+    "-g {gop_size} -keyint_min {gop_size} -sc_threshold 0 " \
+    "{media}/{video_base_name}_{codec}{size}_crf{crf}_{start_time_format}.{extension}"
+
+# decoded back to the source resolution, the one metrics are computed at, in the yuv420p the readers of the
+# headerless .yuv files expect whatever the format of the source
+decode_quality_segment_command = \
+    "-y -i {media}/{video_file_name} -s {width}x{height} -pix_fmt yuv420p " \
+    "{media}/{video_base_name}_{codec}{size}_crf{crf}_{start_time_format}.{extension}"
+
+decode_bitrate_segment_command = \
+    "-y -i {media}/{video_file_name} -s {width}x{height} -pix_fmt yuv420p " \
+    "{media}/{video_base_name}_{codec}{size}_b{bitrate}_{start_time_format}.{extension}"
+
+encode_bitrate_segment_command = \
+    "-y -i {media}/{video_file_name} " \
+    "-ss {start_time} -t {duration} " \
+    "{scale}-c:v {codec} {codec_options}-b:v {bitrate} -maxrate {bitrate} -bufsize {bitrate} " \
+    "-g {gop_size} -keyint_min {gop_size} -sc_threshold 0 " \
+    "{media}/{video_base_name}_{codec}{size}_b{bitrate}_{start_time_format}.{extension}"
+
+split_quality_segments_command = \
+    "-y -i {media}/{video_file_name} " \
+    "-map 0 -c copy " \
+    "-f segment -segment_times {segment_times} -reset_timestamps 1 " \
+    "{media}/{video_base_name}_{codec}{size}_crf{crf}_part%05d.{extension}"
+
+split_bitrate_segments_command = \
+    "-y -i {media}/{video_file_name} " \
+    "-map 0 -c copy " \
+    "-f segment -segment_times {segment_times} -reset_timestamps 1 " \
+    "{media}/{video_base_name}_{codec}{size}_b{bitrate}_part%05d.{extension}"
+
+split_quality_part_file = "{video_base_name}_{codec}{size}_crf{crf}_part{part:05d}.{extension}"
+split_bitrate_part_file = "{video_base_name}_{codec}{size}_b{bitrate}_part{part:05d}.{extension}"
+
+# raw reference segments, headerless, so their pixel format is the one psnr, vmaf and the encodes read them with
+yuv_segment_output = \
+    "-ss {start_time} -t {duration} -pix_fmt yuv420p " \
+    "{media}/{video_base_name}_{start_time_format}.{extension}"
+
+encode_yuv_segment = "-y -i {media}/{video_file_name} " + yuv_segment_output
+
+# one decode of the source feeding every rung encode and reference segment
+fan_out_command = "-y -i {media}/{video_file_name} {outputs}"
+# the same through a cascade of scalers, every resolution is scaled once from the previous, larger one
+fan_out_scaled_command = "-y -i {media}/{video_file_name} -filter_complex \"{graph}\" {outputs}"
+mapped_output = "-map \"[{label}]\" {output}"
+mapped_encode_output = "-map \"[{label}]\" -map 0:a? {output}"
+scale_filter = "scale={width}:{height}"
+scale_option = "-vf {filter} "
+
+# the raw reference has no timestamps, frames are paired by their index; the distorted
+# segment is scaled to the metric size, the reference size unless metrics are sampled, and
+# converted to the yuv420p the reference was written in
+psnr_command = "-f rawvideo -pix_fmt yuv420p -s {width}x{height} -i {media}/{file_orig} -i {media}/{file_compare} " \
+               "-lavfi \"[0:v]setpts=N/TB{step_filter}{reference_scale}[reference];" \
+               "[1:v]scale={metric_width}:{metric_height},format=yuv420p,setpts=N/TB{step_filter}[distorted];" \
+               "[reference][distorted]psnr\" " \
+               "-f null - 2>&1 | grep average | cut -d' ' -f8 | cut -d':' -f2"
+# decoded frames written to stdout for the in-process PSNR engine
+raw_reference_frames_command = \
+    "-v error -i {media}/{video_file_name} " \
+    "-ss {start_time} -t {duration} " \
+    "-f rawvideo -pix_fmt yuv420p -s {width}x{height} -"
+raw_frames_command = \
+    "-v error -i {media}/{video_file_name} " \
+    "-f rawvideo -pix_fmt yuv420p -s {width}x{height} -"
+# decoded frames written to named pipes read by run_vmaf
+fifo_reference_frames_command = \
+    "-v error -y -i {media}/{video_file_name} " \
+    "-ss {start_time} -t {duration} " \
+    "-f rawvideo -pix_fmt yuv420p -s {width}x{height} {media}/{fifo}"
+fifo_frames_command = \
+    "-v error -y -i {media}/{video_file_name} " \
+    "-f rawvideo -pix_fmt yuv420p -s {width}x{height} {media}/{fifo}"
+# VMAF computed inside ffmpeg, needs an ffmpeg built with libvmaf
+libvmaf_command = \
+    "-v error -i {media}/{file_compare} " \
+    "-ss {start_time} -t {duration} -i {media}/{video_file_name} " \
+    "-lavfi \"[0:v]scale={metric_width}:{metric_height},setpts=PTS-STARTPTS{step_filter}[distorted];" \
+    "[1:v]setpts=PTS-STARTPTS{step_filter}{reference_scale}[reference];" \
+    "[distorted][reference]libvmaf=log_fmt=json:log_path=/dev/stdout\" " \
+    "-f null -"
+# every metric of a segment in one pass: the distorted segment and the reference are decoded once and
+# split between the psnr and ssim filters and libvmaf, which also computes MS-SSIM; the log is read from stderr
+score_command = \
+    "-hide_banner -nostats -i {media}/{file_compare} " \
+    "-ss {start_time} -t {duration} -i {media}/{video_file_name} " \
+    "-lavfi \"[0:v]scale={metric_width}:{metric_height},settb=AVTB,setpts=PTS-STARTPTS{step_filter},{distorted};" \
+    "[1:v]settb=AVTB,setpts=PTS-STARTPTS{step_filter}{reference_scale},{reference};{scorers}\" " \
+    "-f null - 2>&1"
+score_split = "split={count}{labels}"
+score_filters = {"psnr": "psnr", "ssim": "ssim",
+                 "libvmaf": "libvmaf=log_fmt=json:log_path={media}/{log}{features}"}
+libvmaf_features = {"ms_ssim": ":feature=name=float_ms_ssim"}
+# sampled metrics: every frame_step-th frame at the metric resolution, written to stdout, a fifo or a file;
+# the reference is seeked on the input so that frame steps count from the segment start
+sampled_reference_frames_command = \
+    "-v error -y -ss {start_time} -t {duration} -i {media}/{video_file_name} " \
+    "{frame_step}-f rawvideo -pix_fmt yuv420p -s {metric_width}x{metric_height} {output}"
+sampled_frames_command = \
+    "-v error -y -i {media}/{video_file_name} " \
+    "{frame_step}-f rawvideo -pix_fmt yuv420p -s {metric_width}x{metric_height} {output}"
+frame_step_option = "-vf framestep={step} "
+frame_step_filter = ",framestep={step}"
+metric_scale_filter = ",scale={width}:{height}"
+vmaf_command = "yuv420p {width} {height} {media}/{file_orig} {media}/{file_compare} --out-fmt json"
+# the full-length encode cut along its keyframes into DASH init and media segments, without re-encoding
+dash_package_command = \
+    "-y -i {media}/{video_file_name} -map 0:v -c copy " \
+    "-f dash {segment_duration} -use_template 1 -use_timeline 1 " \
+    "-init_seg_name {representation}_init.{init_extension} " \
+    "-media_seg_name '{representation}_$Number%05d$.{media_extension}' " \
+    "{media}/{dash_directory}/{representation}.mpd"
+# ffmpeg before 4.0 only knows min_seg_duration, in microseconds
+dash_segment_duration = "-seg_duration {duration}"
+dash_min_segment_duration = "-min_seg_duration {microseconds}"
+dash_media_name = "{representation}_{number:05d}.{media_extension}"
+dash_manifest_file = "{video_base_name}.mpd"
+dash_directory = "{video_base_name}_dash"
+# extensions of the init and media segments
+dash_extensions = {"mp4": ("mp4", "m4s"), "webm": ("webm", "webm")}
+psnr_quality_file = "{video_base_name}_{codec}{size}_crf{crf}_{start_time_format}.{extension}"
+psnr_bitrate_file = "{video_base_name}_{codec}{size}_b{bitrate}_{start_time_format}.{extension}"
+psnr_yuv_file = "{video_base_name}_{start_time_format}.{extension}"
+
+
+encode_commands = {"crf": encode_quality_command, "bitrate": encode_bitrate_command}
+encode_outputs = {"crf": encode_quality_output, "bitrate": encode_bitrate_output}
+encoded_files = {"crf": encoded_quality_file, "bitrate": encoded_bitrate_file}
+encode_segment_commands = {"crf": encode_quality_segment_command, "bitrate": encode_bitrate_segment_command}
+decode_segment_commands = {"crf": decode_quality_segment_command, "bitrate": decode_bitrate_segment_command}
+segment_files = {"crf": psnr_quality_file, "bitrate": psnr_bitrate_file}
+split_segments_commands = {"crf": split_quality_segments_command, "bitrate": split_bitrate_segments_command}
+split_part_files = {"crf": split_quality_part_file, "bitrate": split_bitrate_part_file}
+rung_labels = {"crf": "crf: %s", "bitrate": "bitrate: %s"}
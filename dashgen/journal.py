@@ -0,0 +1,52 @@
+import json
+import os
+import threading
+
+
+class Journal(object):
+    """Append-only JSON lines file recording every completed metric result.
+
+    Each record is flushed and synced to disk as soon as its result is known, so
+    a run that dies keeps everything it computed. A resumed run loads the records
+    back, dropping a last line left incomplete by the interruption.
+    """
+
+    def __init__(self, file_name, resume=False):
+        self.file_name = file_name
+        self.lock = threading.Lock()
+        self.records = {}
+        if resume and os.path.isfile(file_name):
+            self.load()
+        self.file = open(file_name, 'a' if resume else 'w')
+
+    def load(self):
+        valid_size = 0
+        with open(self.file_name, 'rb') as file:
+            for line in file:
+                try:
+                    record = json.loads(line.decode())
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                self.records[record["key"]] = record
+                valid_size += len(line)
+        if valid_size != os.path.getsize(self.file_name):
+            print("Dropping incomplete journal record: %s" % self.file_name)
+            os.truncate(self.file_name, valid_size)
+        print("Journaled results: %d" % len(self.records))
+
+    def get(self, key):
+        return self.records.get(key)
+
+    def append(self, key, **record):
+        record["key"] = key
+        line = json.dumps(record, sort_keys=True) + "\n"
+        with self.lock:
+            self.records[key] = record
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
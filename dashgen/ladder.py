@@ -0,0 +1,372 @@
+import collections
+import json
+import os
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from .cache import parse_size
+from .commands import rung_labels, scale_filter
+
+
+class Codec(object):
+    """An ffmpeg encoder, the container its encodes are written in and the options added to each of them."""
+
+    def __init__(self, name, extension, options=""):
+        self.name = name
+        self.extension = extension
+        self.options = options.strip()
+
+    def __repr__(self):
+        return "Codec(%r, %r, options=%r)" % (self.name, self.extension, self.options)
+
+
+# the codecs rungs can be encoded with, by ffmpeg encoder name
+codecs = collections.OrderedDict()
+
+
+def register_codec(name, extension, options=""):
+    """Adds a codec to the registry, or replaces the container and options of a known one."""
+    if not extension:
+        raise ValueError("Codec %s needs the extension of its container" % name)
+    codecs[name] = Codec(name, extension, options)
+    return codecs[name]
+
+
+def get_codec(name):
+    if name not in codecs:
+        raise ValueError("Unknown codec: %s (known codecs: %s)" % (name, ", ".join(codecs)))
+    return codecs[name]
+
+
+register_codec("libx264", "mp4")
+register_codec("libx265", "mp4")
+register_codec("vp9", "webm")
+register_codec("libvpx-vp9", "webm")
+register_codec("libaom-av1", "webm")
+register_codec("libsvtav1", "mp4")
+
+
+def parse_resolution(resolution):
+    """Reads 1280x720, or a height such as 720 or 720p which keeps the aspect ratio of the source."""
+    if resolution is None:
+        return None
+    if isinstance(resolution, (tuple, list)):
+        width, height = resolution
+        return (int(width) if width else None), int(height)
+    text = str(resolution).strip().lower()
+    try:
+        if "x" in text:
+            width, height = text.split("x")
+            return int(width), int(height)
+        return None, int(text.rstrip("p"))
+    except ValueError:
+        raise ValueError("Invalid resolution: %s" % resolution)
+
+
+class Source(object):
+    """A video file to encode; its duration and resolution are filled in when the run probes it."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.directory = os.path.dirname(self.path)
+        self.file_name = os.path.basename(self.path)
+        self.base_name = os.path.splitext(self.file_name)[0]
+        self.digest = None
+        self.duration = None
+        self.width = None
+        self.height = None
+
+    def __eq__(self, other):
+        return isinstance(other, Source) and self.path == other.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return "Source(%r)" % self.path
+
+
+class Rung(object):
+    """One representation of a ladder: a codec with either a CRF or a bitrate.
+
+    Without a ``resolution`` the rung is encoded at the resolution of the source.
+    """
+
+    def __init__(self, codec, crf=None, bitrate=None, resolution=None):
+        if (crf is None) == (bitrate is None):
+            raise ValueError("A rung needs either a crf or a bitrate")
+        self.codec = codec
+        self.crf = crf
+        # as ffmpeg likes it: 500k, 1M...
+        self.bitrate = None if bitrate is None else str(bitrate)
+        self.resolution = parse_resolution(resolution)
+        get_codec(codec)
+
+    @property
+    def extension(self):
+        # container and options are those the registry has for the codec when the run starts
+        return get_codec(self.codec).extension
+
+    @property
+    def codec_options(self):
+        return get_codec(self.codec).options
+
+    @property
+    def mode(self):
+        return "crf" if self.crf is not None else "bitrate"
+
+    @property
+    def value(self):
+        return self.crf if self.crf is not None else self.bitrate
+
+    @property
+    def key(self):
+        return self.codec, self.mode, self.value, self.resolution
+
+    @property
+    def size_name(self):
+        if self.resolution is None:
+            return ""
+        width, height = self.resolution
+        return "%dx%d" % (width, height) if width else "%dp" % height
+
+    @property
+    def scale_filter(self):
+        # -2 keeps the aspect ratio with an even width
+        width, height = self.resolution
+        return scale_filter.format(width=width or -2, height=height)
+
+    @property
+    def label(self):
+        # key of the rung in the result files
+        return "%s@%s" % (self.value, self.size_name) if self.resolution else self.value
+
+    def __eq__(self, other):
+        return isinstance(other, Rung) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __str__(self):
+        return " ".join([self.codec] + ([self.size_name] if self.resolution else []) +
+                        [rung_labels[self.mode] % self.value])
+
+    def __repr__(self):
+        if self.resolution:
+            return "Rung(%r, %s=%r, resolution=%r)" % (self.codec, self.mode, self.value, self.size_name)
+        return "Rung(%r, %s=%r)" % (self.codec, self.mode, self.value)
+
+
+class Ladder(object):
+    """The rungs encoded for a source and the segment size their keyframes are aligned to."""
+
+    def __init__(self, rungs, segment_size, frames_per_second=24):
+        self.rungs = []
+        for rung in rungs:
+            if rung not in self.rungs:
+                self.rungs.append(rung)
+        self.segment_size = segment_size
+        self.frames_per_second = frames_per_second
+
+    @property
+    def gop_size(self):
+        return self.segment_size * self.frames_per_second
+
+    @property
+    def codecs(self):
+        return sorted(set(rung.codec for rung in self.rungs))
+
+    @property
+    def anchor_codec(self):
+        # the codec of the first rung, the others are compared with it
+        return self.rungs[0].codec
+
+    def __repr__(self):
+        return "Ladder(%r, segment_size=%r, frames_per_second=%r)" % (self.rungs, self.segment_size,
+                                                                      self.frames_per_second)
+
+
+class Plan(object):
+    """Every source with its ladder, and the options the whole run is made with.
+
+    A source added several times gets the union of its ladders, so a rung shared
+    by several ladders is only encoded and measured once.
+    """
+
+    defaults = collections.OrderedDict([
+        ("calculate_psnr", False),
+        ("calculate_vmaf", False),
+        ("calculate_ssim", False),
+        ("calculate_ms_ssim", False),
+        ("calculate_size", False),
+        ("single_pass", False),
+        ("psnr_engine", "ffmpeg"),
+        ("psnr_chunk_frames", 8),
+        ("vmaf_engine", "files"),
+        ("metric_frame_step", 1),
+        ("metric_resolution", None),
+        ("calibration_segments", 2),
+        ("resume", False),
+        ("clean", False),
+        ("scratch_budget", None),
+        ("segment_mode", "encode"),
+        ("decode_once", False),
+        ("segmentation", "fixed"),
+        ("scene_threshold", 0.4),
+        ("min_segment_size", None),
+        ("max_segment_size", None),
+        ("package", False),
+        ("results_store", False),
+        ("target_metric", None),
+        ("target_value", None),
+        ("target_tolerance", 0.5),
+        ("target_scope", "segment"),
+        ("max_probes", 6),
+        ("cache_dir", None),
+        ("cache_size", None),
+        ("jobs", 1),
+        ("backend", "docker"),
+        ("pool_size", None),
+        ("queue_dir", None),
+        ("lease_timeout", 30),
+        ("max_attempts", 3),
+        ("profile", None),
+    ])
+
+    def __init__(self, **options):
+        unknown = set(options) - set(self.defaults)
+        if unknown:
+            raise TypeError("Unknown plan options: %s" % ", ".join(sorted(unknown)))
+        for name, default in self.defaults.items():
+            setattr(self, name, options.get(name, default))
+        if self.decode_once:
+            self.segment_mode = "split"
+        if self.scratch_budget:
+            # files are removed after their last reader, the budget counts them until then
+            self.clean = True
+        if self.calculate_ssim or self.calculate_ms_ssim:
+            # SSIM and MS-SSIM are only computed by the single pass scoring
+            self.single_pass = True
+        if self.queue_dir and self.vmaf_engine == "fifo":
+            raise ValueError("The fifo VMAF engine runs its commands on a single host, it cannot be used with a "
+                             "work queue")
+        for name in ("scratch_budget", "cache_size"):
+            try:
+                if getattr(self, name):
+                    parse_size(getattr(self, name))
+            except ValueError:
+                raise ValueError("Invalid %s: %s" % (name.replace("_", " "), getattr(self, name)))
+        if self.metric_frame_step < 1:
+            raise ValueError("Invalid metric frame step: %d" % self.metric_frame_step)
+        if self.target_metric:
+            if self.target_value is None:
+                raise ValueError("A %s target needs a target value" % self.target_metric)
+            if self.segment_mode != "encode":
+                raise ValueError("Searches encode every probed segment from the source, they need the encode "
+                                 "segment mode")
+            # the target metric is measured on every probe
+            setattr(self, "calculate_" + self.target_metric, True)
+        self.ladders = collections.OrderedDict()
+
+    @property
+    def metrics(self):
+        return [metric for metric in ("vmaf", "psnr", "ssim", "ms_ssim") if getattr(self, "calculate_" + metric)]
+
+    @property
+    def sampled(self):
+        # metrics computed on a subset of the frames or on downscaled copies
+        return self.metric_frame_step > 1 or bool(self.metric_resolution)
+
+    @property
+    def sources(self):
+        return list(self.ladders)
+
+    def add(self, source, ladder):
+        if not isinstance(source, Source):
+            source = Source(source)
+        for other in self.ladders:
+            if other != source and other.base_name == source.base_name:
+                # results are written as <base name>_<mode>_<metric>.json
+                raise ValueError("Sources with the same name: %s and %s" % (other.path, source.path))
+        existing = self.ladders.get(source)
+        if existing is not None:
+            if (existing.segment_size, existing.frames_per_second) != (ladder.segment_size,
+                                                                        ladder.frames_per_second):
+                raise ValueError("Ladders of %s have different segment sizes or frame rates" % source.path)
+            ladder = Ladder(existing.rungs + ladder.rungs, ladder.segment_size, ladder.frames_per_second)
+        self.ladders[source] = ladder
+        return source
+
+
+def paired_resolutions(values, resolutions, default=None):
+    """Pairs qualities or bitrates with their resolution, given one per value."""
+    if not values:
+        return []
+    if resolutions is None:
+        return [(value, default) for value in values]
+    if len(resolutions) != len(values):
+        raise ValueError("%d resolutions given for %d rungs" % (len(resolutions), len(values)))
+    return list(zip(values, resolutions))
+
+
+def ladder_from_spec(spec):
+    """Builds a ladder from its spec, rungs given one by one or as lists like on the command line."""
+    codec = spec.get("codec")
+    # qualities and bitrates are encoded with each codec of a list
+    codecs = codec if isinstance(codec, list) else [codec]
+    resolution = spec.get("resolution")
+    rungs = [Rung(rung.get("codec", codecs[0]), crf=rung.get("crf"), bitrate=rung.get("bitrate"),
+                  resolution=rung.get("resolution", resolution))
+             for rung in spec.get("rungs", [])]
+    rungs += [Rung(name, crf=crf, resolution=size) for name in codecs
+              for crf, size in paired_resolutions(spec.get("qualities", []), spec.get("resolutions"), resolution)]
+    rungs += [Rung(name, bitrate=bitrate, resolution=size) for name in codecs
+              for bitrate, size in paired_resolutions(spec.get("bitrates", []), spec.get("resolutions"), resolution)]
+    if not rungs:
+        raise ValueError("Ladder without rungs: %r" % spec)
+    return Ladder(rungs, spec["segment_size"], spec.get("frames_per_second", 24))
+
+
+def plan_from_spec(spec, directory=".", **options):
+    """Builds a plan from a ladder spec, relative source paths are taken from ``directory``.
+
+    ``options`` take precedence over the options of the spec.
+    """
+    plan_options = dict((name.replace("-", "_"), value) for name, value in spec.get("options", {}).items())
+    plan_options.update(options)
+    plan = Plan(**plan_options)
+    for name, settings in spec.get("codecs", {}).items():
+        # new codecs, or other containers and options for the known ones
+        known = codecs.get(name)
+        register_codec(name, settings.get("extension", known and known.extension),
+                       settings.get("options", known.options if known else ""))
+    ladders = dict((name, ladder_from_spec(ladder)) for name, ladder in spec.get("ladders", {}).items())
+    for entry in spec["sources"]:
+        if not isinstance(entry, dict):
+            entry = {"path": entry}
+        ladder = entry.get("ladder", spec.get("ladder"))
+        if ladder is None:
+            raise ValueError("No ladder for source %s" % entry["path"])
+        if not isinstance(ladder, dict):
+            if ladder not in ladders:
+                raise ValueError("Unknown ladder %r for source %s" % (ladder, entry["path"]))
+            ladder = ladders[ladder]
+        else:
+            ladder = ladder_from_spec(ladder)
+        plan.add(Source(os.path.join(directory, entry["path"])), ladder)
+    return plan
+
+
+def load_plan(file_name, **options):
+    """Reads a JSON or YAML (needs PyYAML) ladder spec file."""
+    with open(file_name) as file:
+        if os.path.splitext(file_name)[1].lower() in (".yaml", ".yml"):
+            if yaml is None:
+                raise RuntimeError("YAML ladder specs need PyYAML installed (pip install pyyaml)")
+            spec = yaml.safe_load(file)
+        else:
+            spec = json.load(file)
+    return plan_from_spec(spec, os.path.dirname(os.path.abspath(file_name)), **options)
@@ -0,0 +1,143 @@
+import collections
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+
+mpd_namespace = "urn:mpeg:dash:schema:mpd:2011"
+# segment byte sizes are recorded in attributes of our own namespace, ignored by players
+dashgen_namespace = "urn:dashgen"
+
+ElementTree.register_namespace("", mpd_namespace)
+ElementTree.register_namespace("dashgen", dashgen_namespace)
+
+
+def parse_duration(duration):
+    """Seconds of an ISO 8601 duration such as PT1H2M3.5S."""
+    match = re.match(r"P(?:(\d+(?:\.\d+)?)D)?(?:T(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?)?$",
+                     duration.strip())
+    if not match:
+        raise ValueError("Invalid duration: %s" % duration)
+    days, hours, minutes, seconds = (float(value or 0) for value in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def format_duration(seconds):
+    return "PT%.3fS" % seconds
+
+
+def read_representation(mpd_file, representation_id, media_name):
+    """Reads the single representation of an MPD written by ffmpeg's dash muxer.
+
+    ``media_name`` gives the file name of a media segment from its number; the
+    segments are listed with their start, duration and size on disk.
+    """
+    root = ElementTree.parse(mpd_file).getroot()
+    directory = os.path.dirname(mpd_file)
+
+    def find(element, tag):
+        return element.find(".//{%s}%s" % (mpd_namespace, tag))
+
+    adaptation_set = find(root, "AdaptationSet")
+    representation = find(root, "Representation")
+    template = find(root, "SegmentTemplate")
+    timescale = int(template.get("timescale", 1))
+    number = int(template.get("startNumber", 1))
+
+    segments = []
+    time = 0
+    for entry in find(template, "SegmentTimeline"):
+        time = int(entry.get("t", time))
+        for _ in range(int(entry.get("r", 0)) + 1):
+            file_name = media_name(number)
+            segments.append(dict(media=file_name, start=time / timescale,
+                                 duration=int(entry.get("d")) / timescale,
+                                 size=os.path.getsize(os.path.join(directory, file_name))))
+            time += int(entry.get("d"))
+            number += 1
+
+    attributes = dict(adaptation_set.attrib)
+    attributes.update(representation.attrib)
+    initialization = template.get("initialization").replace("$RepresentationID$", representation.get("id"))
+    return collections.OrderedDict([
+        ("id", representation_id),
+        ("mime_type", attributes.get("mimeType")),
+        ("codecs", attributes.get("codecs")),
+        ("width", attributes.get("width")),
+        ("height", attributes.get("height")),
+        ("frame_rate", attributes.get("frameRate")),
+        ("initialization", initialization),
+        ("initialization_size", os.path.getsize(os.path.join(directory, initialization))),
+        # the peak segment bitrate, what a player needs to be sure to sustain the rung
+        ("bandwidth", max([int(8 * segment["size"] / segment["duration"]) for segment in segments
+                           if segment["duration"]] or [int(attributes.get("bandwidth", 0))])),
+        ("duration", parse_duration(root.get("mediaPresentationDuration"))),
+        ("segments", segments),
+    ])
+
+
+def build_manifest(representations, min_buffer_time):
+    """Returns a static MPD listing every segment of the representations.
+
+    Representations of the same mime type and codec family share an adaptation
+    set, so players can switch between them.
+    """
+    mpd = ElementTree.Element("{%s}MPD" % mpd_namespace, {
+        "profiles": "urn:mpeg:dash:profile:isoff-live:2011",
+        "type": "static",
+        "mediaPresentationDuration": format_duration(max(representation["duration"]
+                                                         for representation in representations)),
+        "minBufferTime": format_duration(min_buffer_time),
+    })
+    period = ElementTree.SubElement(mpd, "{%s}Period" % mpd_namespace, {"id": "0", "start": "PT0S"})
+
+    adaptation_sets = collections.OrderedDict()
+    for representation in representations:
+        family = (representation["mime_type"], (representation["codecs"] or "").split(".")[0])
+        if family not in adaptation_sets:
+            adaptation_sets[family] = ElementTree.SubElement(period, "{%s}AdaptationSet" % mpd_namespace, {
+                "id": str(len(adaptation_sets)),
+                "contentType": "video",
+                "mimeType": representation["mime_type"],
+                "segmentAlignment": "true",
+                "startWithSAP": "1",
+            })
+        attributes = {"id": representation["id"], "bandwidth": str(representation["bandwidth"])}
+        for name, attribute in (("codecs", "codecs"), ("width", "width"), ("height", "height"),
+                                ("frame_rate", "frameRate")):
+            if representation[name]:
+                attributes[attribute] = str(representation[name])
+        element = ElementTree.SubElement(adaptation_sets[family], "{%s}Representation" % mpd_namespace, attributes)
+
+        # durations in milliseconds, every segment listed with its own size
+        segment_list = ElementTree.SubElement(element, "{%s}SegmentList" % mpd_namespace, {"timescale": "1000"})
+        ElementTree.SubElement(segment_list, "{%s}Initialization" % mpd_namespace, {
+            "sourceURL": representation["initialization"],
+            "{%s}size" % dashgen_namespace: str(representation["initialization_size"]),
+        })
+        timeline = ElementTree.SubElement(segment_list, "{%s}SegmentTimeline" % mpd_namespace)
+        for segment in representation["segments"]:
+            ElementTree.SubElement(timeline, "{%s}S" % mpd_namespace, {
+                "t": str(int(round(segment["start"] * 1000))),
+                "d": str(int(round(segment["duration"] * 1000))),
+            })
+        for segment in representation["segments"]:
+            ElementTree.SubElement(segment_list, "{%s}SegmentURL" % mpd_namespace, {
+                "media": segment["media"],
+                "{%s}size" % dashgen_namespace: str(segment["size"]),
+                "{%s}duration" % dashgen_namespace: "%.3f" % segment["duration"],
+            })
+
+    indent(mpd)
+    return '<?xml version="1.0" encoding="utf-8"?>\n' + ElementTree.tostring(mpd, encoding="unicode") + "\n"
+
+
+def indent(element, level=0):
+    # ElementTree.indent() needs Python 3.9
+    padding = "\n" + "  " * level
+    if len(element):
+        element.text = padding + "  "
+        for child in element:
+            indent(child, level + 1)
+        child.tail = padding
+    if level and not element.tail:
+        element.tail = padding
@@ -0,0 +1,134 @@
+import collections
+import math
+import os
+import re
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def vmaf_score(log):
+    # run_vmaf output, libvmaf 1.x and libvmaf 2.x logs
+    if "aggregate" in log:
+        return float(log["aggregate"]["VMAF_score"])
+    if "pooled_metrics" in log:
+        return float(log["pooled_metrics"]["vmaf"]["mean"])
+    return float(log["VMAF score"])
+
+
+def vmaf_frames(log):
+    # per-frame scores: run_vmaf output, or libvmaf logs with every metric of a frame
+    return [float(frame["metrics"]["vmaf"]) if "metrics" in frame else float(frame["VMAF_score"])
+            for frame in log.get("frames", [])]
+
+
+def ms_ssim_score(log):
+    # libvmaf 2.x log with the float_ms_ssim feature
+    return float(log["pooled_metrics"]["float_ms_ssim"]["mean"])
+
+
+def filter_scores(output):
+    """PSNR and SSIM of the whole segment, from the summary lines the psnr and ssim filters log."""
+    scores = {}
+    psnr = re.search(r"PSNR y:\S+ u:\S+ v:\S+ average:(\S+)", output)
+    if psnr:
+        scores["psnr"] = float(psnr.group(1))
+    ssim = re.search(r"SSIM Y:.* All:(\S+)", output)
+    if ssim:
+        scores["ssim"] = float(ssim.group(1))
+    return scores
+
+
+# two-sided 95% quantiles of Student's t distribution by degrees of freedom, the normal one above
+t_quantiles = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145,
+               2.131, 2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048,
+               2.045, 2.042]
+
+
+def calibration(pairs):
+    """Error of sampled values against exact ones, given as (sampled, exact) pairs.
+
+    The interval is the 95% prediction interval of the exact value minus the
+    sampled one, for a segment that was not calibrated.
+    """
+    errors = [exact - sampled for sampled, exact in pairs]
+    count = len(errors)
+    bias = sum(errors) / count if count else None
+    if count < 2:
+        return collections.OrderedDict([("count", count), ("bias", bias), ("deviation", None), ("interval", None)])
+    deviation = math.sqrt(sum((error - bias) ** 2 for error in errors) / (count - 1))
+    quantile = t_quantiles[count - 2] if count - 1 <= len(t_quantiles) else 1.96
+    margin = quantile * deviation * math.sqrt(1 + 1.0 / count)
+    return collections.OrderedDict([("count", count), ("bias", bias), ("deviation", deviation),
+                                    ("interval", [bias - margin, bias + margin])])
+
+
+def release_fifo(fifo, flags):
+    # opening the other end wakes up a process blocked opening the fifo, which then
+    # sees the end of the stream (reader) or a broken pipe (writer)
+    try:
+        descriptor = os.open(fifo, flags | os.O_NONBLOCK)
+    except OSError:
+        return
+    os.close(descriptor)
+
+
+def psnr_from_mse(mse):
+    return 10 * math.log10(255 ** 2 / mse) if mse > 0 else float("inf")
+
+
+def stream_psnr(reference, distorted, width, height, chunk_frames):
+    """Computes the PSNR of two yuv420p pipes, reading ``chunk_frames`` frames at a time.
+
+    Returns the per-frame and per-plane values; the segment averages are taken
+    over the mean squared errors, the same way ffmpeg's psnr filter does.
+    """
+    chroma_size = ((width + 1) // 2) * ((height + 1) // 2)
+    plane_sizes = (width * height, chroma_size, chroma_size)
+    frame_size = sum(plane_sizes)
+    frames = []
+    mse_sums = numpy.zeros(4)
+    extra = {"reference": 0, "distorted": 0}
+
+    while True:
+        reference_chunk = reference.read(frame_size * chunk_frames)
+        distorted_chunk = distorted.read(frame_size * chunk_frames)
+        count = min(len(reference_chunk), len(distorted_chunk)) // frame_size
+        if count:
+            reference_frames = numpy.frombuffer(reference_chunk, numpy.uint8, count * frame_size).reshape(count, -1)
+            distorted_frames = numpy.frombuffer(distorted_chunk, numpy.uint8, count * frame_size).reshape(count, -1)
+            mses = numpy.empty((count, 4))
+            offset = 0
+            for plane, size in enumerate(plane_sizes):
+                difference = reference_frames[:, offset:offset + size].astype(numpy.int32)
+                difference -= distorted_frames[:, offset:offset + size]
+                mses[:, plane] = numpy.einsum("ij,ij->i", difference, difference) / size
+                offset += size
+            mses[:, 3] = mses[:, :3].dot(plane_sizes) / frame_size
+            mse_sums += mses.sum(axis=0)
+            for frame_mses in mses:
+                frames.append(dict(zip(("y", "u", "v", "average"), (psnr_from_mse(mse) for mse in frame_mses))))
+        if len(reference_chunk) < frame_size * chunk_frames or len(distorted_chunk) < frame_size * chunk_frames:
+            extra["reference"] += len(reference_chunk) - count * frame_size
+            extra["distorted"] += len(distorted_chunk) - count * frame_size
+            break
+
+    # let both decoders run to the end so their exit status can be checked
+    for pipe, name in ((reference, "reference"), (distorted, "distorted")):
+        while True:
+            data = pipe.read(frame_size * chunk_frames)
+            if not data:
+                break
+            extra[name] += len(data)
+        # a partial frame left by a decoder is not worth a message
+        if extra[name] // frame_size:
+            print("Ignoring %d extra %s frames" % (extra[name] // frame_size, name))
+
+    if not frames:
+        raise ValueError("No frames to compare")
+    result = dict(zip(("y", "u", "v", "average"), (psnr_from_mse(mse) for mse in mse_sums / len(frames))))
+    result["frames"] = frames
+    return result
+
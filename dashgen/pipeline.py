@@ -0,0 +1,1380 @@
+import bisect
+import collections
+import concurrent.futures
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import uuid
+
+from .backends import QueueBackend, create_backend
+from .bdrate import bd_quality, bd_rate
+from .cache import ArtifactCache, parse_size, remove_files, write_atomically
+from .commands import dash_directory, dash_extensions, dash_manifest_file, dash_media_name, \
+    dash_min_segment_duration, dash_package_command, dash_segment_duration, decode_segment_commands, encode_commands, \
+    encode_outputs, encode_quality_segment_from_yuv_segment_command, encode_segment_commands, encode_yuv_segment, \
+    encoded_files, fan_out_command, fan_out_scaled_command, ffprobe_duration, ffprobe_packets, fifo_frames_command, \
+    fifo_reference_frames_command, force_key_frames_option, frame_step_filter, frame_step_option, libvmaf_command, \
+    libvmaf_features, mapped_encode_output, mapped_output, metric_scale_filter, psnr_command, psnr_yuv_file, \
+    raw_frames_command, raw_reference_frames_command, sampled_frames_command, sampled_reference_frames_command, \
+    scale_option, scene_cuts_command, scenes_file, score_command, score_filters, score_split, segment_files, \
+    segments_file, split_part_files, split_segments_commands, vmaf_command, yuv_segment_output
+from .journal import Journal
+from .ladder import parse_resolution
+from .manifest import build_manifest, read_representation
+from .metrics import calibration, filter_scores, ms_ssim_score, numpy, release_fifo, stream_psnr, vmaf_frames, \
+    vmaf_score
+from .profile import Profiler, format_bytes
+from .scheduler import Scheduler
+from .search import search, search_rungs
+from .segmentation import fixed_segments, scene_cuts, scene_segments, start_time_format
+from .store import ResultsStore
+
+
+def packet_time(packet, name):
+    # fields ffprobe could not fill are missing or N/A
+    try:
+        return float(packet[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class SharedFiles(object):
+    """Reference counts of the working files read by several jobs.
+
+    Every job reading a file registers itself when the job graph is built and
+    releases the file when it is done; with ``remove`` set, the file is deleted
+    as soon as its last reader has finished. With a ``budget``, the bytes of the
+    files reserved by their producers are counted until then, and a reservation
+    that would go over the budget is refused unless it is forced.
+    """
+
+    def __init__(self, remove=False, budget=None):
+        self.remove = remove
+        self.lock = threading.Lock()
+        self.counts = collections.Counter()
+        self.budget = budget
+        self.sizes = {}
+        self.in_flight = 0
+        self.peak = 0
+
+    def reserve(self, file_name, size, force=False):
+        with self.lock:
+            if file_name in self.sizes or not self.counts[file_name]:
+                # already counted, or never read and so never released
+                return True
+            if not force and self.in_flight and self.in_flight + size > self.budget:
+                return False
+            self.sizes[file_name] = size
+            self.in_flight += size
+            self.peak = max(self.peak, self.in_flight)
+            return True
+
+    def use(self, *file_names):
+        with self.lock:
+            self.counts.update(file_names)
+
+    def release(self, *file_names):
+        released = []
+        with self.lock:
+            for file_name in file_names:
+                self.counts[file_name] -= 1
+                if self.counts[file_name] == 0:
+                    del self.counts[file_name]
+                    released.append(file_name)
+                    self.in_flight -= self.sizes.pop(file_name, 0)
+        if self.remove:
+            remove_files(*released)
+
+
+class Run(object):
+    """One run of a plan: the backend, caches and journals, and the job graph of every source.
+
+    Jobs are keyed by source and rung, so the work shared by several ladders or
+    several metrics is only done once.
+    """
+
+    def __init__(self, plan, backend=None):
+        self.plan = plan
+        # the backend of the plan unless one is given, such as the simulated one of the benchmarks
+        self.backend = backend or create_backend(plan.backend, plan.pool_size or plan.jobs)
+        if plan.queue_dir:
+            # commands are run by the workers of the queue, with the backend of the plan
+            self.backend = QueueBackend(plan.queue_dir, self.backend, plan.lease_timeout, plan.max_attempts)
+        self.caches = {}
+        self.journals = {}
+        self.profiler = Profiler() if plan.profile else None
+        self.backend.profiler = self.profiler
+        budget = parse_size(plan.scratch_budget) if plan.scratch_budget else None
+        # under a scratch budget, the raw files of a segment are written when there is room for them and
+        # the segments are worked on in order, so that every rung reads a reference within a short time
+        self.scheduler = Scheduler(plan.jobs, self.profiler, self.admit if budget else None,
+                                   self.segment_order if budget else None)
+        self.backend.current_job = self.scheduler.current_job
+        self.shared_files = SharedFiles(plan.clean, budget)
+        # raw file and estimated size written by the producer jobs, by job key, and the producers not started
+        self.scratch_files = {}
+        self.producers = None
+        # raw reference segments written by the decode-once fan-outs of this run, not extracted again
+        self.fanned_out = set()
+        self.segment_plans = {}
+        self.psnr_details = {}
+        self.vmaf_details = {}
+        self.stores = {}
+        self.representations = {}
+        self.results = collections.OrderedDict()
+        self.results_lock = threading.Lock()
+
+    def execute(self):
+        plan = self.plan
+        if not plan.ladders:
+            raise ValueError("Nothing to run, the plan has no source")
+        if plan.psnr_engine == "numpy" and numpy is None:
+            raise RuntimeError("The numpy PSNR engine needs numpy installed (pip install numpy)")
+        if plan.results_store and numpy is None:
+            raise RuntimeError("The results store needs numpy installed (pip install numpy)")
+
+        print("Calculate PSNR: %r" % plan.calculate_psnr)
+        print("Calculate VMAF: %r" % plan.calculate_vmaf)
+        print("Calculate SSIM: %r" % plan.calculate_ssim)
+        print("Calculate MS-SSIM: %r" % plan.calculate_ms_ssim)
+        print("Calculate segment sizes: %r" % plan.calculate_size)
+        print("PSNR engine: %s" % plan.psnr_engine)
+        print("VMAF engine: %s" % plan.vmaf_engine)
+        print("Single pass scoring: %r" % plan.single_pass)
+        if plan.sampled:
+            print("Metric sampling: every %d frames at %s, %d calibration segments" % (
+                plan.metric_frame_step, plan.metric_resolution or "the source resolution", plan.calibration_segments))
+        print("Remove quality segment files: %r" % plan.clean)
+        print("Scratch budget: %s" % plan.scratch_budget)
+        print("Resume: %r" % plan.resume)
+        print("Segment mode: %s" % plan.segment_mode)
+        print("Decode once: %r" % plan.decode_once)
+        print("Segmentation: %s" % plan.segmentation)
+        print("Package: %r" % plan.package)
+        print("Results store: %r" % plan.results_store)
+        if plan.target_metric:
+            print("Target: %s %.2f (+/- %.2f) per %s, %d probes at most" % (
+                plan.target_metric.upper(), plan.target_value, plan.target_tolerance, plan.target_scope,
+                plan.max_probes))
+        print("Parallel jobs: %d" % plan.jobs)
+        print("Backend: %s" % plan.backend)
+        if plan.queue_dir:
+            print("Work queue: %s (leases of %ds, %d attempts)" % (plan.queue_dir, plan.lease_timeout,
+                                                                   plan.max_attempts))
+        print("Profile: %s" % plan.profile)
+        try:
+            # the execution backend is chosen once for the whole run
+            print("Startup overhead per job: %.3fs" % self.backend.measure_overhead(plan.sources[0].directory))
+            if plan.package:
+                self.check_packaging()
+            for source in plan.sources:
+                self.probe(source)
+            for source in plan.sources:
+                self.add_jobs(source)
+            self.scheduler.run()
+            self.backend.report()
+            if plan.scratch_budget:
+                print("Scratch space: %s at most, budget %s" % (format_bytes(self.shared_files.peak),
+                                                                plan.scratch_budget))
+            if self.profiler:
+                self.profiler.report(self.profiler.write(plan.profile, self.scheduler.tasks, self.scheduler.jobs))
+        finally:
+            self.backend.stop()
+            for journal in list(self.journals.values()) + list(self.stores.values()):
+                journal.close()
+        return self.results
+
+    def cache(self, source):
+        # intermediate files are reused through a cache keyed by the source content
+        directory = self.plan.cache_dir or os.path.join(source.directory, ".dashgen_cache")
+        if directory not in self.caches:
+            self.caches[directory] = ArtifactCache(directory, parse_size(self.plan.cache_size)
+                                                   if self.plan.cache_size else None)
+            print("Cache directory: %s" % directory)
+        return self.caches[directory]
+
+    def probe(self, source):
+        ladder = self.plan.ladders[source]
+        print("-----")
+        print("Video file: %s" % source.path)
+        print("Rungs: %s" % ", ".join(str(rung) for rung in ladder.rungs))
+        print("Segment Size: %d" % ladder.segment_size)
+        print("Video file exists: %s" % os.path.isfile(source.path))
+        source.digest = self.cache(source).source_digest(source.path)
+        print("Source digest: %s" % source.digest)
+
+        ffprobe_command_string = ffprobe_duration.format(media=self.backend.media("ffprobe", source.directory),
+                                                         video_file_name=source.file_name)
+        print("Duration command: %s" % ffprobe_command_string)
+        ffprobe_command_json = json.loads(self.run_command(source, ffprobe_command_string, "ffprobe").decode())
+        source.duration = float(ffprobe_command_json["streams"][0]["duration"])
+        source.width = int(float(ffprobe_command_json["streams"][0]["coded_width"]))
+        source.height = int(float(ffprobe_command_json["streams"][0]["coded_height"]))
+        print("Video duration: %ds" % source.duration)
+        print("Video resolution: %dx%d" % (source.width, source.height))
+        self.segment_plans[source] = self.plan_segments(source)
+
+    def plan_segments(self, source):
+        """Duration of every segment of a source by start time."""
+        ladder = self.plan.ladders[source]
+        if self.plan.segmentation != "scenes":
+            return fixed_segments(source.duration, ladder.segment_size)
+        minimum, maximum = self.segment_bounds(source)
+        segments = scene_segments(self.detect_scenes(source), source.duration, minimum, maximum,
+                                  ladder.frames_per_second)
+        print("Scene segments: %d, %.3fs to %.3fs long" % (len(segments), min(segments.values()),
+                                                           max(segments.values())))
+        write_atomically(segments_file.format(video_base_name=source.base_name), json.dumps(
+            [collections.OrderedDict([("start", start), ("duration", duration)])
+             for start, duration in segments.items()], indent=4, separators=(',', ': ')))
+        return segments
+
+    def segment_bounds(self, source):
+        segment_size = self.plan.ladders[source].segment_size
+        return self.plan.min_segment_size or segment_size / 2.0, self.plan.max_segment_size or segment_size * 2
+
+    def detect_scenes(self, source):
+        """Scene cut times of a source, from a single decoding pass cached like the other artifacts."""
+        cache = self.cache(source)
+        file_name = self.working_file(source, scenes_file.format(video_base_name=source.base_name))
+        if cache.fetch(self.artifact_key(source, "scenes", threshold=self.plan.scene_threshold), file_name):
+            print("Escape detecting scenes: cached")
+        else:
+            output = self.run_command(source, scene_cuts_command.format(
+                **self.format_arguments(source, None, threshold=self.plan.scene_threshold)))
+            write_atomically(file_name, json.dumps(scene_cuts(output.decode())))
+            cache.publish(self.artifact_key(source, "scenes", threshold=self.plan.scene_threshold), file_name)
+        with open(file_name) as file:
+            cuts = json.load(file)
+        os.remove(file_name)
+        print("Scene cuts: %d" % len(cuts))
+        return cuts
+
+    def segment_duration(self, source, start_time):
+        return self.segment_plans.get(source, {}).get(start_time, self.plan.ladders[source].segment_size)
+
+    def gop_size(self, source):
+        # keyframes of variable length segments are forced, the GOP size only caps them
+        ladder = self.plan.ladders[source]
+        if self.plan.segmentation != "scenes":
+            return ladder.gop_size
+        return int(math.ceil(self.segment_bounds(source)[1] * ladder.frames_per_second))
+
+    def key_frames(self, source):
+        # a single shot has no boundary to force a keyframe on
+        if self.plan.segmentation != "scenes" or len(self.segment_plans.get(source, ())) < 2:
+            return ""
+        return force_key_frames_option.format(times=",".join(str(start) for start in self.segments(source)[1:]))
+
+    def boundary_parameters(self, source):
+        # encodes of variable length segments depend on every boundary
+        if self.plan.segmentation != "scenes":
+            return {}
+        return dict(boundaries=self.segments(source))
+
+    def run_command(self, source, command_string, tool="ffmpeg"):
+        return self.backend.run(tool, command_string, source.directory)
+
+    def segments(self, source):
+        return list(self.segment_plans[source])
+
+    def segment_source(self, rung):
+        if self.plan.segment_mode == "split":
+            return "split"
+        elif self.plan.calculate_vmaf and self.plan.vmaf_engine == "files" and not self.plan.single_pass and \
+                rung.mode == "crf":
+            # crf segments for vmaf are encoded from the raw reference segment
+            return "yuv"
+        return "source"
+
+    def format_arguments(self, source, rung, start_time=0, **kwargs):
+        # crf and bitrate templates take the rung under a different name, format() ignores the other one
+        arguments = dict(current_dir=source.directory,
+                         media=self.backend.media("ffmpeg", source.directory),
+                         video_file_name=source.file_name,
+                         video_base_name=source.base_name,
+                         codec=rung and rung.codec,
+                         codec_options=rung.codec_options + " " if rung and rung.codec_options else "",
+                         size="_" + rung.size_name if rung and rung.resolution else "",
+                         scale=scale_option.format(filter=rung.scale_filter) if rung and rung.resolution else "",
+                         crf=rung and rung.value,
+                         bitrate=rung and rung.value,
+                         gop_size=self.gop_size(source),
+                         key_frames=self.key_frames(source),
+                         start_time=start_time,
+                         start_time_format=start_time_format(start_time),
+                         duration=self.segment_duration(source, start_time),
+                         width=source.width,
+                         height=source.height,
+                         extension=rung and rung.extension)
+        arguments.update(self.sample_arguments(source))
+        arguments.update(kwargs)
+        return arguments
+
+    def metric_size(self, source, exact=False):
+        if exact or not self.plan.metric_resolution:
+            return source.width, source.height
+        width, height = parse_resolution(self.plan.metric_resolution)
+        if height >= source.height:
+            return source.width, source.height
+        # yuv420p needs an even width
+        return width or int(round(source.width * height / source.height / 2.0)) * 2, height
+
+    def sample_arguments(self, source, exact=False):
+        # the frames and the resolution metrics are computed on, every frame at the source resolution when exact
+        step = 1 if exact else self.plan.metric_frame_step
+        width, height = self.metric_size(source, exact)
+        scaled = (width, height) != (source.width, source.height)
+        return dict(frame_step=frame_step_option.format(step=step) if step > 1 else "",
+                    step_filter=frame_step_filter.format(step=step) if step > 1 else "",
+                    reference_scale=metric_scale_filter.format(width=width, height=height) if scaled else "",
+                    metric_width=width,
+                    metric_height=height)
+
+    def decoded_extension(self, exact=False):
+        # decoded segments and references of sampled metrics only have the frames scored
+        return "sampled.yuv" if self.plan.sampled and not exact else "yuv"
+
+    def media_file(self, source, file_name):
+        return "%s/%s" % (self.backend.media("ffmpeg", source.directory), file_name)
+
+    def yuv_segment_name(self, source, start_time, extension):
+        return psnr_yuv_file.format(video_base_name=source.base_name,
+                                    start_time_format=start_time_format(start_time),
+                                    extension=extension)
+
+    def encoded_name(self, source, rung):
+        return encoded_files[rung.mode].format(**self.format_arguments(source, rung))
+
+    def encoded_segment_name(self, source, rung, start_time, extension=None):
+        return segment_files[rung.mode].format(**self.format_arguments(source, rung, start_time,
+                                                                       extension=extension or rung.extension))
+
+    def working_file(self, source, file_name):
+        return os.path.join(source.directory, file_name)
+
+    def remove_working_files(self, source, *file_names):
+        remove_files(*[self.working_file(source, file_name) for file_name in file_names])
+
+    def artifact_key(self, source, artifact, **parameters):
+        # everything the content of the file depends on
+        parameters.update(artifact=artifact, source=source.digest, ffmpeg=self.backend.version)
+        return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+    def codec_parameters(self, rung):
+        # encoder options are only in the keys of the codecs that have some, the others keep their cache
+        return dict(codec_options=rung.codec_options) if rung.codec_options else {}
+
+    def rung_key(self, source, rung):
+        ladder = self.plan.ladders[source]
+        return self.artifact_key(source, "encode", codec=rung.codec, mode=rung.mode, rung=rung.value,
+                                 resolution=rung.resolution, gop_size=self.gop_size(source),
+                                 frames_per_second=ladder.frames_per_second, extension=rung.extension,
+                                 **dict(self.boundary_parameters(source), **self.codec_parameters(rung)))
+
+    def sampling_parameters(self, extension=None):
+        if not self.plan.sampled or extension == "yuv":
+            return {}
+        return dict(frame_step=self.plan.metric_frame_step, metric_resolution=self.plan.metric_resolution)
+
+    def reference_key(self, source, start_time, extension):
+        return self.artifact_key(source, "reference", start_time=start_time,
+                                 duration=self.segment_duration(source, start_time), extension=extension,
+                                 **self.sampling_parameters(extension))
+
+    def segment_key(self, source, rung, start_time, extension=None):
+        ladder = self.plan.ladders[source]
+        parameters = dict(self.boundary_parameters(source), **self.codec_parameters(rung))
+        if extension:
+            parameters.update(self.sampling_parameters(extension))
+        return self.artifact_key(source, "segment" if extension is None else "decoded", codec=rung.codec,
+                                 mode=rung.mode, rung=rung.value, resolution=rung.resolution,
+                                 gop_size=self.gop_size(source),
+                                 frames_per_second=ladder.frames_per_second, container=rung.extension,
+                                 start_time=start_time, duration=self.segment_duration(source, start_time),
+                                 segment_source=self.segment_source(rung), extension=extension or rung.extension,
+                                 **parameters)
+
+    def metric_engine(self, metric):
+        if self.plan.single_pass:
+            return "single-pass"
+        return self.plan.psnr_engine if metric == "psnr" else self.plan.vmaf_engine
+
+    def result_key(self, metric, source, rung, start_time):
+        engine = self.metric_engine(metric)
+        if engine in ("numpy", "libvmaf", "fifo", "single-pass"):
+            reference = self.artifact_key(source, "frames", start_time=start_time,
+                                          duration=self.segment_duration(source, start_time))
+        else:
+            reference = self.reference_key(source, start_time, "yuv")
+        return self.artifact_key(source, "result", metric=metric, engine=engine,
+                                 segment=self.segment_key(source, rung, start_time), reference=reference,
+                                 **self.sampling_parameters())
+
+    def cacheable(self, file_name):
+        # raw reference and decoded segments are scratch: a hard link in the cache would keep their bytes on disk
+        # after --clean removes them, and they are written again from the source faster than they are worth keeping
+        return not file_name.endswith(".yuv")
+
+    def cached_or_run(self, source, key, file_name, command_string):
+        """Restores a working file from the cache, or creates it with the command and caches it."""
+        if not self.cacheable(file_name):
+            self.remove_working_files(source, file_name)
+            self.run_command(source, command_string)
+            return
+        cache = self.cache(source)
+        if cache.fetch(key, self.working_file(source, file_name)):
+            print("Escape creating %s: cached" % file_name)
+            return
+        # ffmpeg must not write through a hard link into a cache entry
+        self.remove_working_files(source, file_name)
+        self.run_command(source, command_string)
+        cache.publish(key, self.working_file(source, file_name))
+
+    def encode_rung(self, source, rung):
+        self.cached_or_run(source, self.rung_key(source, rung), self.encoded_name(source, rung),
+                           encode_commands[rung.mode].format(**self.format_arguments(source, rung)))
+
+    def create_yuv_segment(self, source, start_time, extension):
+        file_name = self.yuv_segment_name(source, start_time, extension)
+        if self.working_file(source, file_name) in self.fanned_out:
+            print("Escape creating %s: written by the fan-out" % file_name)
+            return
+        if extension == "sampled.yuv":
+            command_string = sampled_reference_frames_command.format(
+                **self.format_arguments(source, None, start_time, output=self.media_file(source, file_name)))
+        else:
+            command_string = encode_yuv_segment.format(**self.format_arguments(source, None, start_time,
+                                                                               extension=extension))
+        self.cached_or_run(source, self.reference_key(source, start_time, extension), file_name, command_string)
+
+    def fan_out(self, source, reference_extensions):
+        cache = self.cache(source)
+        # (cache key, file name, output arguments, rung or None for the reference segments)
+        outputs = []
+        for rung in self.plan.ladders[source].rungs:
+            file_name = self.encoded_name(source, rung)
+            if not cache.fetch(self.rung_key(source, rung), self.working_file(source, file_name)):
+                outputs.append((self.rung_key(source, rung), file_name,
+                                encode_outputs[rung.mode].format(**self.format_arguments(source, rung, scale="")),
+                                rung))
+        for j in self.segments(source):
+            for extension in reference_extensions:
+                file_name = self.yuv_segment_name(source, j, extension)
+                if not (self.cacheable(file_name) and
+                        cache.fetch(self.reference_key(source, j, extension), self.working_file(source, file_name))):
+                    outputs.append((self.reference_key(source, j, extension), file_name,
+                                    yuv_segment_output.format(**self.format_arguments(source, None, j,
+                                                                                      extension=extension)),
+                                    None))
+        if not outputs:
+            print("Escape decoding source: every output is cached")
+            return
+        self.remove_working_files(source, *[file_name for _, file_name, _, _ in outputs])
+        if any(rung and rung.resolution for _, _, _, rung in outputs):
+            graph, output_arguments = self.scaler_cascade(outputs)
+            command_string = fan_out_scaled_command.format(graph=graph, outputs=output_arguments,
+                                                           **self.format_arguments(source, None))
+        else:
+            command_string = fan_out_command.format(outputs=" ".join(output for _, _, output, _ in outputs),
+                                                    **self.format_arguments(source, None))
+        self.run_command(source, command_string)
+        for key, file_name, _, rung in outputs:
+            if self.cacheable(file_name):
+                cache.publish(key, self.working_file(source, file_name))
+            elif rung is None:
+                self.fanned_out.add(self.working_file(source, file_name))
+
+    def scaler_cascade(self, outputs):
+        """Filter graph splitting the decoded source between the fan-out outputs.
+
+        Every resolution is scaled once, from the next larger one, and shared by all
+        the rungs encoded at it. Returns the graph and the output arguments, each
+        output mapped to its own branch.
+        """
+        def resolution(output):
+            return output[3].resolution if output[3] else None
+
+        scalers = collections.OrderedDict()
+        for output in sorted([output for output in outputs if resolution(output)],
+                             key=lambda output: (resolution(output)[1], resolution(output)[0] or 0), reverse=True):
+            scalers.setdefault(resolution(output), output[3].scale_filter)
+        levels = [None] + list(scalers)
+        chains = []
+        output_arguments = []
+        for level, size in enumerate(levels):
+            consumers = [output for output in outputs if resolution(output) == size]
+            labels = ["s%d_%d" % (level, n) for n in range(len(consumers))]
+            # the last branch of each level feeds the scaler of the next, smaller, resolution
+            branches = labels + (["s%d" % (level + 1)] if level + 1 < len(levels) else [])
+            filters = ([scalers[size]] if size else []) + ["split=%d" % len(branches)]
+            chains.append("[%s]%s%s" % ("s%d" % level if level else "0:v", ",".join(filters),
+                                        "".join("[%s]" % branch for branch in branches)))
+            for label, (_, _, output, rung) in zip(labels, consumers):
+                output_arguments.append((mapped_encode_output if rung else mapped_output).format(label=label,
+                                                                                                 output=output))
+        return ";".join(chains), " ".join(output_arguments)
+
+    def encode_segment(self, source, rung, start_time, from_yuv):
+        if from_yuv:
+            command_string = encode_quality_segment_from_yuv_segment_command.format(
+                **self.format_arguments(source, rung, start_time,
+                                        video_file_name=self.yuv_segment_name(source, start_time, "yuv")))
+        else:
+            command_string = encode_segment_commands[rung.mode].format(
+                **self.format_arguments(source, rung, start_time))
+        self.cached_or_run(source, self.segment_key(source, rung, start_time),
+                           self.encoded_segment_name(source, rung, start_time), command_string)
+
+    def split_rung(self, source, rung):
+        # the full-length encode has a keyframe on every segment boundary, so its segments
+        # are cut out with a stream copy instead of decoding the source once per segment
+        cache = self.cache(source)
+        segments = self.segments(source)
+        segment_names = [self.encoded_segment_name(source, rung, j) for j in segments]
+        if all([cache.fetch(self.segment_key(source, rung, j), self.working_file(source, name))
+                for j, name in zip(segments, segment_names)]):
+            print("Escape splitting segments: %s" % self.encoded_name(source, rung))
+            return
+
+        self.remove_working_files(source, *segment_names)
+        # cut at the end of the last segment too, so it has the frames the encode segment mode gives it
+        end = segments[-1] + self.segment_duration(source, segments[-1])
+        self.run_command(source, split_segments_commands[rung.mode].format(
+            **self.format_arguments(source, rung, video_file_name=self.encoded_name(source, rung),
+                                    segment_times=",".join(str(j) for j in segments[1:] + [end]))))
+        part = 0
+        while True:
+            part_name = self.working_file(source, split_part_files[rung.mode].format(
+                **self.format_arguments(source, rung, part=part)))
+            if not os.path.isfile(part_name):
+                break
+            if part < len(segment_names):
+                os.replace(part_name, self.working_file(source, segment_names[part]))
+                cache.publish(self.segment_key(source, rung, segments[part]),
+                              self.working_file(source, segment_names[part]))
+            else:
+                # tail after the last segment, dropped like in the encode segment mode
+                os.remove(part_name)
+            part += 1
+
+    def decode_segment(self, source, rung, start_time, exact=False):
+        extension = self.decoded_extension(exact)
+        file_name = self.encoded_segment_name(source, rung, start_time, extension)
+        if extension == "sampled.yuv":
+            command_string = sampled_frames_command.format(
+                **self.format_arguments(source, rung, start_time, output=self.media_file(source, file_name),
+                                        video_file_name=self.encoded_segment_name(source, rung, start_time)))
+        else:
+            command_string = decode_segment_commands[rung.mode].format(
+                **self.format_arguments(source, rung, start_time, extension="yuv",
+                                        video_file_name=self.encoded_segment_name(source, rung, start_time)))
+        self.cached_or_run(source, self.segment_key(source, rung, start_time, extension), file_name, command_string)
+
+    def representation_id(self, source, rung):
+        # the encoded file name without the source name, e.g. libx264_720p_crf23
+        return os.path.splitext(self.encoded_name(source, rung))[0][len(source.base_name) + 1:]
+
+    def ffmpeg_major_version(self):
+        match = re.match(r"ffmpeg version n?(\d+)\.", self.backend.version or "")
+        return int(match.group(1)) if match else None
+
+    def check_packaging(self):
+        # the dash muxer of ffmpeg 3 (the default docker image is 3.2) only writes mp4 segments
+        version = self.ffmpeg_major_version()
+        webm = [str(rung) for source in self.plan.sources for rung in self.plan.ladders[source].rungs
+                if rung.extension == "webm"]
+        if webm and version is not None and version < 4:
+            raise ValueError("DASH packaging of webm rungs (%s) needs ffmpeg 4 or later, the backend has: %s" % (
+                ", ".join(webm), self.backend.version))
+
+    def dash_segment_duration(self, source):
+        ladder = self.plan.ladders[source]
+        segment_size = ladder.segment_size
+        if self.plan.segmentation == "scenes":
+            # every forced keyframe starts a segment once the shortest one is reached
+            segment_size = round(min(self.segment_plans[source].values()) - 0.5 / ladder.frames_per_second, 3)
+        version = self.ffmpeg_major_version()
+        if version is not None and version < 4:
+            return dash_min_segment_duration.format(microseconds=int(segment_size * 1000000))
+        return dash_segment_duration.format(duration=segment_size)
+
+    def package_rung(self, source, rung):
+        ladder = self.plan.ladders[source]
+        representation = self.representation_id(source, rung)
+        directory_name = dash_directory.format(video_base_name=source.base_name)
+        directory = self.working_file(source, directory_name)
+        os.makedirs(directory, exist_ok=True)
+        # segments left by a previous, longer, packaging of the rung
+        remove_files(*[os.path.join(directory, file_name) for file_name in os.listdir(directory)
+                       if file_name.startswith(representation + "_") or file_name == representation + ".mpd"])
+
+        init_extension, media_extension = dash_extensions[rung.extension]
+        self.run_command(source, dash_package_command.format(
+            **self.format_arguments(source, rung, video_file_name=self.encoded_name(source, rung),
+                                    segment_duration=self.dash_segment_duration(source),
+                                    representation=representation, dash_directory=directory_name,
+                                    init_extension=init_extension, media_extension=media_extension)))
+        mpd_file = os.path.join(directory, representation + ".mpd")
+        entry = read_representation(mpd_file, representation, lambda number: dash_media_name.format(
+            representation=representation, number=number, media_extension=media_extension))
+        os.remove(mpd_file)
+
+        with self.results_lock:
+            representations = self.representations.setdefault(source, {})
+            representations[rung] = entry
+            # the manifest is rewritten as every rung is packaged, in ladder order
+            manifest = build_manifest([representations[r] for r in ladder.rungs if r in representations],
+                                      max(self.segment_plans[source].values(), default=ladder.segment_size))
+            write_atomically(os.path.join(directory, dash_manifest_file.format(video_base_name=source.base_name)),
+                             manifest)
+        print("Packaged %s: %d segments" % (rung, len(entry["segments"])))
+
+    def read_packets(self, source, rung, video_file_name):
+        """(time, packet) of every packet of an encode, in the order ffprobe lists them."""
+        ffprobe_command_result = self.run_command(source, ffprobe_packets.format(
+            **self.format_arguments(source, rung, media=self.backend.media("ffprobe", source.directory),
+                                    video_file_name=video_file_name)), "ffprobe")
+        packets = []
+        for packet in json.loads(ffprobe_command_result.decode()).get("packets", []):
+            time = packet_time(packet, "pts_time")
+            packets.append((packet_time(packet, "dts_time") if time is None else time, packet))
+        return packets
+
+    def calculate_sizes(self, source, rung):
+        """Stores the size and bitrate of every segment of a rung, read from the packets of its encode.
+
+        The segments are those of the full-length encode, the ones a DASH player
+        downloads; a single ffprobe pass reads them all.
+        """
+        segments = self.segments(source)
+        ends = [start + self.segment_duration(source, start) for start in segments]
+        sizes = [0] * len(segments)
+        durations = [0.0] * len(segments)
+        times = [[] for _ in segments]
+        for time, packet in self.read_packets(source, rung, self.encoded_name(source, rung)):
+            # keyframes are on the segment boundaries, the tail after the last segment is dropped
+            index = bisect.bisect_right(segments, time) - 1 if time is not None else -1
+            if index >= 0 and time < ends[index]:
+                sizes[index] += int(packet["size"])
+                durations[index] += packet_time(packet, "duration_time") or 0.0
+                times[index].append(time)
+        for index, segment_times in enumerate(times):
+            if not durations[index] and len(segment_times) > 1:
+                # no packet durations in the container, the frame interval is the average one
+                span = max(segment_times) - min(segment_times)
+                durations[index] = span * len(segment_times) / (len(segment_times) - 1)
+        bitrates = [int(8 * size / duration) if duration else 0 for size, duration in zip(sizes, durations)]
+        print("Segment sizes for %s: %s" % (rung, sizes))
+        if self.plan.results_store:
+            self.stores[source].append([row for j, size, bitrate in zip(segments, sizes, bitrates)
+                                        for row in self.result_rows(source, rung, j, "size", size) +
+                                        self.result_rows(source, rung, j, "bitrate", bitrate)])
+        self.store_rung(source, "size", rung, sizes)
+        self.store_rung(source, "bitrate", rung, bitrates)
+        return sizes, bitrates
+
+    def calculate_scored_sizes(self, source, rung):
+        """Stores the size of the segments of a rung encoded one by one, the ones the metrics are computed on."""
+        segments = self.segments(source)
+        sizes = [sum(int(packet["size"]) for _, packet in
+                     self.read_packets(source, rung, self.encoded_segment_name(source, rung, j))) for j in segments]
+        print("Scored segment sizes for %s: %s" % (rung, sizes))
+        if self.plan.results_store:
+            self.stores[source].append([row for j, size in zip(segments, sizes)
+                                        for row in self.result_rows(source, rung, j, "scored_size", size)])
+        self.store_rung(source, "scored_size", rung, sizes)
+        return sizes
+
+    def calculate_vmaf(self, source, rung, start_time, exact=False):
+        print("Calculating VMAF for %s, segment: %s" % (rung, start_time))
+        width, height = self.metric_size(source, exact)
+        extension = self.decoded_extension(exact)
+        vmaf_command_string = vmaf_command.format(media=self.backend.media("vmaf", source.directory),
+                                                  width=width,
+                                                  height=height,
+                                                  file_orig=self.yuv_segment_name(source, start_time, extension),
+                                                  file_compare=self.encoded_segment_name(source, rung, start_time,
+                                                                                         extension))
+        vmaf_command_result = self.run_command(source, vmaf_command_string, "vmaf").decode().replace('\\n', '\n')
+        vmaf_log = json.loads(vmaf_command_result)
+        if not exact:
+            self.vmaf_details[(source, rung, start_time)] = vmaf_frames(vmaf_log)
+        vmaf_command_final = vmaf_log["aggregate"]["VMAF_score"]
+        print("VMAF mean: %s" % vmaf_command_final)
+        return float(vmaf_command_final)
+
+    def calculate_vmaf_libvmaf(self, source, rung, start_time, exact=False):
+        print("Calculating VMAF for %s, segment: %s" % (rung, start_time))
+        vmaf_command_result = self.run_command(source, libvmaf_command.format(
+            **self.format_arguments(source, rung, start_time,
+                                    file_compare=self.encoded_segment_name(source, rung, start_time),
+                                    **self.sample_arguments(source, exact))))
+        vmaf_log = json.loads(vmaf_command_result.decode())
+        if not exact:
+            self.vmaf_details[(source, rung, start_time)] = vmaf_frames(vmaf_log)
+        vmaf_command_final = vmaf_score(vmaf_log)
+        print("VMAF mean: %s" % vmaf_command_final)
+        return vmaf_command_final
+
+    def feed_fifo(self, source, command_string, fifo, job=None):
+        try:
+            if self.profiler:
+                with self.profiler.attached(job):
+                    self.run_command(source, command_string)
+            else:
+                self.run_command(source, command_string)
+        finally:
+            # the scorer must not wait forever on a decoder that failed before opening the fifo
+            release_fifo(self.working_file(source, fifo), os.O_WRONLY)
+
+    def calculate_vmaf_fifo(self, source, rung, start_time, exact=False):
+        print("Calculating VMAF for %s, segment: %s" % (rung, start_time))
+        fifo_prefix = "%s.%s" % (self.encoded_segment_name(source, rung, start_time, "yuv"), uuid.uuid4().hex[:8])
+        reference_fifo, distorted_fifo = fifo_prefix + ".reference.fifo", fifo_prefix + ".distorted.fifo"
+        os.mkfifo(self.working_file(source, reference_fifo))
+        os.mkfifo(self.working_file(source, distorted_fifo))
+        segment = self.encoded_segment_name(source, rung, start_time)
+        if self.plan.sampled and not exact:
+            reference_command = sampled_reference_frames_command.format(
+                **self.format_arguments(source, rung, start_time, output=self.media_file(source, reference_fifo)))
+            distorted_command = sampled_frames_command.format(
+                **self.format_arguments(source, rung, start_time, output=self.media_file(source, distorted_fifo),
+                                        video_file_name=segment))
+        else:
+            reference_command = fifo_reference_frames_command.format(
+                **self.format_arguments(source, rung, start_time, fifo=reference_fifo))
+            distorted_command = fifo_frames_command.format(
+                **self.format_arguments(source, rung, start_time, fifo=distorted_fifo, video_file_name=segment))
+        width, height = self.metric_size(source, exact)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as decoders:
+                job = self.profiler and self.profiler.current_job()
+                decodes = [decoders.submit(self.feed_fifo, source, reference_command, reference_fifo, job),
+                           decoders.submit(self.feed_fifo, source, distorted_command, distorted_fifo, job)]
+                try:
+                    vmaf_command_result = self.run_command(source, vmaf_command.format(
+                        media=self.backend.media("vmaf", source.directory),
+                        width=width,
+                        height=height,
+                        file_orig=reference_fifo,
+                        file_compare=distorted_fifo), "vmaf")
+                finally:
+                    for fifo in (reference_fifo, distorted_fifo):
+                        release_fifo(self.working_file(source, fifo), os.O_RDONLY)
+                for decode in decodes:
+                    decode.result()
+        finally:
+            self.remove_working_files(source, reference_fifo, distorted_fifo)
+        vmaf_log = json.loads(vmaf_command_result.decode().replace('\\n', '\n'))
+        if not exact:
+            self.vmaf_details[(source, rung, start_time)] = vmaf_frames(vmaf_log)
+        vmaf_command_final = vmaf_score(vmaf_log)
+        print("VMAF mean: %s" % vmaf_command_final)
+        return vmaf_command_final
+
+    def calculate_psnr(self, source, rung, start_time, exact=False):
+        print("Calculating PSNR for %s, segment: %s" % (rung, start_time))
+        psnr_command_string = psnr_command.format(media=self.backend.media("ffmpeg", source.directory),
+                                                  width=source.width,
+                                                  height=source.height,
+                                                  file_orig=self.yuv_segment_name(source, start_time, "yuv"),
+                                                  file_compare=self.encoded_segment_name(source, rung, start_time),
+                                                  **self.sample_arguments(source, exact))
+        psnr_command_result = self.run_command(source, psnr_command_string)
+        print("PSNR result: %s" % psnr_command_result.decode().rsplit())
+        return float(psnr_command_result.decode())
+
+    def calculate_psnr_numpy(self, source, rung, start_time, exact=False):
+        print("Calculating PSNR for %s, segment: %s" % (rung, start_time))
+        segment = self.encoded_segment_name(source, rung, start_time)
+        if self.plan.sampled and not exact:
+            reference_command = sampled_reference_frames_command.format(
+                **self.format_arguments(source, rung, start_time, output="-"))
+            distorted_command = sampled_frames_command.format(
+                **self.format_arguments(source, rung, start_time, output="-", video_file_name=segment))
+        else:
+            reference_command = raw_reference_frames_command.format(**self.format_arguments(source, rung, start_time))
+            distorted_command = raw_frames_command.format(
+                **self.format_arguments(source, rung, start_time, video_file_name=segment))
+        width, height = self.metric_size(source, exact)
+        with self.backend.stream("ffmpeg", reference_command, source.directory) as reference, \
+                self.backend.stream("ffmpeg", distorted_command, source.directory) as distorted:
+            result = stream_psnr(reference, distorted, width, height, self.plan.psnr_chunk_frames)
+        if not exact:
+            self.psnr_details[(source, rung, start_time)] = result
+        print("PSNR result: y:%.2f u:%.2f v:%.2f average:%.2f (%d frames)"
+              % (result["y"], result["u"], result["v"], result["average"], len(result["frames"])))
+        return result["average"]
+
+    def calculate_scores(self, source, rung, start_time, metrics, exact=False):
+        """Every metric of ``metrics`` from a single decoding of the segment and of its reference."""
+        print("Calculating %s for %s, segment: %s" % ("/".join(metric.upper() for metric in metrics), rung,
+                                                     start_time))
+        media = self.backend.media("ffmpeg", source.directory)
+        scorers = [scorer for scorer in ("psnr", "ssim") if scorer in metrics]
+        log = None
+        if "vmaf" in metrics or "ms_ssim" in metrics:
+            log = "%s.%s.json" % (self.encoded_segment_name(source, rung, start_time, "scores"), uuid.uuid4().hex[:8])
+            scorers.append("libvmaf")
+        labels = range(len(scorers))
+        try:
+            output = self.run_command(source, score_command.format(**self.format_arguments(
+                source, rung, start_time, file_compare=self.encoded_segment_name(source, rung, start_time),
+                distorted=score_split.format(count=len(scorers), labels="".join("[d%d]" % n for n in labels)),
+                reference=score_split.format(count=len(scorers), labels="".join("[r%d]" % n for n in labels)),
+                scorers=";".join("[d%d][r%d]%s" % (n, n, score_filters[scorer].format(
+                    media=media, log=log, features="".join(libvmaf_features.get(metric, "") for metric in metrics)))
+                                 for n, scorer in zip(labels, scorers)),
+                **self.sample_arguments(source, exact)))).decode()
+            scores = filter_scores(output)
+            if log:
+                with open(self.working_file(source, log)) as file:
+                    vmaf_log = json.load(file)
+                scores["vmaf"] = vmaf_score(vmaf_log)
+                if "ms_ssim" in metrics:
+                    scores["ms_ssim"] = ms_ssim_score(vmaf_log)
+                if not exact:
+                    self.vmaf_details[(source, rung, start_time)] = vmaf_frames(vmaf_log)
+        finally:
+            if log:
+                self.remove_working_files(source, log)
+        missing = [metric for metric in metrics if metric not in scores]
+        if missing:
+            raise RuntimeError("No %s in the scoring output: %s" % (", ".join(missing), output))
+        print("Scores: %s" % ", ".join("%s %s" % (metric.upper(), scores[metric]) for metric in metrics))
+        return collections.OrderedDict((metric, scores[metric]) for metric in metrics)
+
+    def metric_function(self, metric):
+        if self.plan.single_pass:
+            return lambda source, rung, start_time, exact=False: \
+                self.calculate_scores(source, rung, start_time, [metric], exact)[metric]
+        if metric == "vmaf":
+            return dict(files=self.calculate_vmaf, libvmaf=self.calculate_vmaf_libvmaf,
+                        fifo=self.calculate_vmaf_fifo)[self.plan.vmaf_engine]
+        return self.calculate_psnr_numpy if self.plan.psnr_engine == "numpy" else self.calculate_psnr
+
+    def measure(self, source, rung, start_time):
+        """Target metric of a probed segment, from the journal or encoded and measured now.
+
+        The encodes of every probe stay in the cache, so a later search, or a run with
+        another target, only encodes what it did not probe yet.
+        """
+        metric = self.plan.target_metric
+        record = self.journals[(source, rung.mode)].get(self.result_key(metric, source, rung, start_time))
+        if record is not None:
+            return self.restore_result(metric, source, rung, start_time, record)
+        file_names = [self.encoded_segment_name(source, rung, start_time)]
+        try:
+            self.encode_segment(source, rung, start_time, self.segment_source(rung) == "yuv")
+            if self.metric_engine(metric) == "files":
+                file_names.append(self.encoded_segment_name(source, rung, start_time, self.decoded_extension()))
+                self.decode_segment(source, rung, start_time)
+            return self.journaled(metric, self.metric_function(metric), source, rung, start_time)
+        finally:
+            if self.plan.clean:
+                self.remove_working_files(source, *file_names)
+
+    def search_result(self, rungs, index, value, probes):
+        rung = rungs[index]
+        return collections.OrderedDict([(rung.mode, rung.value), (self.plan.target_metric, value),
+                                        ("probes", [[rungs[i].value, probe] for i, probe in probes.items()])])
+
+    def search_segment(self, source, rungs, start_time):
+        plan = self.plan
+        index, value, probes = search(lambda i: self.measure(source, rungs[i], start_time), len(rungs),
+                                      plan.target_value, plan.target_tolerance, plan.max_probes)
+        print("Search for %s, segment: %s: %s, %s %.2f after %d probes" % (
+            rungs[0].codec, start_time, rungs[index], plan.target_metric.upper(), value, len(probes)))
+        result = collections.OrderedDict([("segment", start_time)])
+        result.update(self.search_result(rungs, index, value, probes))
+        return result
+
+    def search_title(self, source, rungs):
+        # the quality of a probe is the mean of its segments, measured one after the other: the
+        # search is a single job, and the other jobs of the run already take the other workers
+        plan = self.plan
+        segments = self.segments(source)
+
+        def measure(index):
+            # weighted by the duration of the segments
+            return sum(self.measure(source, rungs[index], j) * self.segment_duration(source, j) for j in segments) / \
+                sum(self.segment_duration(source, j) for j in segments)
+
+        index, value, probes = search(measure, len(rungs), plan.target_value, plan.target_tolerance,
+                                      plan.max_probes)
+        print("Search for %s: %s, mean %s %.2f after %d probes" % (
+            rungs[0].codec, rungs[index], plan.target_metric.upper(), value, len(probes)))
+        return self.search_result(rungs, index, value, probes)
+
+    def write_search(self, source, rungs, search_jobs):
+        # searches are keyed by the first rung of their range, and named after its resolution
+        result = [self.scheduler.results[key] for key in search_jobs]
+        with self.results_lock:
+            values = self.results.setdefault(source.path, collections.OrderedDict()).setdefault("search", {})
+            values[rungs[0]] = result if self.plan.target_scope == "segment" else result[0]
+            name = self.results_name(source, rungs[0])
+            self.write_results(name, self.plan.target_metric,
+                               dict((rung.size_name or "source", values[rung]) for rung in values
+                                    if self.results_name(source, rung) == name), "_search")
+
+    def calibrate(self, metric, source, rung, start_time):
+        """Exact value of a sampled metric, over every frame at the source resolution."""
+        print("Calibrating %s for %s, segment: %s" % (metric.upper(), rung, start_time))
+        # only the file decoded here, the calibration of another metric may still read its own
+        decoded = []
+        try:
+            if self.metric_engine(metric) == "files":
+                decoded.append(self.encoded_segment_name(source, rung, start_time, "yuv"))
+                self.decode_segment(source, rung, start_time, exact=True)
+            return self.metric_function(metric)(source, rung, start_time, exact=True)
+        finally:
+            if self.plan.clean:
+                self.remove_working_files(source, *decoded)
+
+    def write_calibration(self, source, metric, calibrated):
+        # sampled and exact values of the calibration segments, and the error interval they give
+        pairs = [(self.scheduler.results[(metric, source.path, rung.key, j)], self.scheduler.results[key])
+                 for key, rung, j in calibrated]
+        result = calibration(pairs)
+        print("%s calibration of %s: bias %s, interval %s" % (metric.upper(), source.file_name, result["bias"],
+                                                             result["interval"]))
+        result["frame_step"] = self.plan.metric_frame_step
+        result["resolution"] = "%dx%d" % self.metric_size(source)
+        result["segments"] = sorted(set(j for _, _, j in calibrated))
+        result["values"] = [collections.OrderedDict([("rung", str(rung)), ("segment", j), ("sampled", sampled),
+                                                     ("exact", exact)])
+                            for (_, rung, j), (sampled, exact) in zip(calibrated, pairs)]
+        self.write_results(source.base_name, metric, result, "_calibration")
+
+    def add_yuv_segment(self, source, start_time, extension, depends=()):
+        """Adds the job extracting a raw reference segment, a producer of scratch files."""
+        key = self.scheduler.add(("reference" if extension == "yuv" else "sampled-reference", source.path, start_time),
+                                 self.create_yuv_segment, source, start_time, extension, depends=depends)
+        self.scratch_files[key] = (self.working_file(source, self.yuv_segment_name(source, start_time, extension)),
+                                   self.raw_size(source, start_time, extension))
+        return key
+
+    def raw_size(self, source, start_time, extension):
+        # yuv420p frames of the segment, only the sampled ones at the metric size for sampled files
+        width, height = self.metric_size(source, extension == "yuv")
+        frames = self.segment_duration(source, start_time) * self.plan.ladders[source].frames_per_second
+        step = self.plan.metric_frame_step if extension != "yuv" else 1
+        return int(width * height * 3 // 2 * math.ceil(frames / step))
+
+    def admit(self, key, force=False):
+        if key not in self.scratch_files:
+            return True
+        if self.producers is None:
+            self.producers = [job for job in sorted(self.scheduler.tasks, key=self.segment_order)
+                              if job in self.scratch_files]
+        file_name, size = self.scratch_files[key]
+        if not force and self.shared_files.in_flight:
+            # any producer starts when its file fits, next to the room kept for the earlier ones not started
+            room = self.shared_files.budget - self.shared_files.in_flight - size
+            for job in self.producers:
+                if job == key:
+                    break
+                room -= self.scratch_files[job][1]
+                if room < 0:
+                    return False
+        if not self.shared_files.reserve(file_name, size, force):
+            return False
+        self.producers.remove(key)
+        if force and self.shared_files.in_flight > self.shared_files.budget:
+            print("Scratch budget exceeded to make progress: %s" % os.path.basename(file_name))
+        return True
+
+    def segment_order(self, key):
+        # segment jobs by start time, the jobs of whole rungs and sources first
+        return key[-1] if isinstance(key[-1], (int, float)) else -1
+
+    def add_reader(self, key, source, file_names, function, *arguments, depends=()):
+        """Adds a job reading the working files ``file_names``, they are released once the job has run."""
+        file_names = [self.working_file(source, file_name) for file_name in file_names]
+        if key not in self.scheduler.tasks:
+            self.shared_files.use(*file_names)
+        return self.scheduler.add(key, self.read_files, file_names, function, *arguments, depends=depends)
+
+    def read_files(self, file_names, function, *arguments):
+        result = function(*arguments)
+        self.shared_files.release(*file_names)
+        return result
+
+    def journaled(self, metric, function, source, rung, start_time):
+        value = function(source, rung, start_time)
+        self.journal_value(metric, source, rung, start_time, value)
+        return value
+
+    def journaled_scores(self, metrics, source, rung, start_time):
+        scores = self.calculate_scores(source, rung, start_time, metrics)
+        for metric, value in scores.items():
+            self.journal_value(metric, source, rung, start_time, value)
+        return scores
+
+    def score(self, score_job, metric):
+        return self.scheduler.results[score_job][metric]
+
+    def journal_value(self, metric, source, rung, start_time, value):
+        ladder = self.plan.ladders[source]
+        self.journals[(source, rung.mode)].append(
+            self.result_key(metric, source, rung, start_time), metric=metric, rung=rung.value, segment=start_time,
+            value=value, details=self.result_details(metric, source, rung, start_time),
+            inputs=dict(video=source.path, codec=rung.codec, mode=rung.mode, resolution=rung.size_name or None,
+                        duration=self.segment_duration(source, start_time),
+                        frames_per_second=ladder.frames_per_second, segment_source=self.segment_source(rung)))
+        if self.plan.results_store:
+            self.stores[source].append(self.result_rows(source, rung, start_time, metric, value))
+
+    def result_rows(self, source, rung, start_time, metric, value):
+        """Rows of the results store for a segment value and the per-frame values behind it."""
+        def row(frame, name, row_value):
+            return (source.path, rung.codec, rung.mode, str(rung.value), rung.size_name, start_time, frame, name,
+                    float(row_value))
+
+        rows = [row(-1, metric, value)]
+        details = self.psnr_details.get((source, rung, start_time)) if metric == "psnr" else None
+        if details:
+            rows += [row(-1, "psnr_" + plane, details[plane]) for plane in "yuv"]
+            rows += [row(frame, "psnr" if plane == "average" else "psnr_" + plane, values[plane])
+                     for frame, values in enumerate(details["frames"]) for plane in ("y", "u", "v", "average")]
+        if metric == "vmaf":
+            rows += [row(frame, "vmaf", frame_value)
+                     for frame, frame_value in enumerate(self.vmaf_details.get((source, rung, start_time), []))]
+        return rows
+
+    def result_details(self, metric, source, rung, start_time):
+        # per-frame values kept in the journal, so a resumed run can still store them
+        if metric == "psnr":
+            return self.psnr_details.get((source, rung, start_time))
+        if metric != "vmaf":
+            return None
+        frames = self.vmaf_details.get((source, rung, start_time))
+        return {"frames": frames} if frames else None
+
+    def restore_result(self, metric, source, rung, start_time, record):
+        print("Escape calculating %s for %s, segment: %s: journaled" % (metric.upper(), rung, start_time))
+        if record.get("details"):
+            if metric == "psnr":
+                self.psnr_details[(source, rung, start_time)] = record["details"]
+            elif metric == "vmaf":
+                self.vmaf_details[(source, rung, start_time)] = record["details"]["frames"]
+        if self.plan.results_store:
+            # rows the store lost with an incomplete chunk, the others are skipped
+            self.stores[source].append(self.result_rows(source, rung, start_time, metric, record["value"]))
+        return record["value"]
+
+    def results_name(self, source, rung):
+        # one file per rate control mode, and per codec when the ladder has several
+        codecs = self.plan.ladders[source].codecs
+        return "_".join([source.base_name] + ([rung.codec] if len(codecs) > 1 else []) + [rung.mode])
+
+    def write_results(self, name, metric, values, suffix=""):
+        if not suffix:
+            print("\n%sS: %s" % (metric.upper(), values))
+        with open(name + "_" + metric + suffix + ".json", 'w') as file:
+            file.write(json.dumps(values, sort_keys=False, indent=4, separators=(',', ': ')))
+
+    def collect_rung(self, source, metric, rung):
+        self.store_rung(source, metric, rung, [self.scheduler.results[(metric, source.path, rung.key, j)]
+                                               for j in self.segments(source)])
+
+    def collect_scores(self, source, rung):
+        self.store_rung(source, "score", rung, [
+            collections.OrderedDict([("segment", j)] + [(metric, self.scheduler.results[(metric, source.path,
+                                                                                          rung.key, j)])
+                                                        for metric in self.plan.metrics])
+            for j in self.segments(source)])
+
+    def store_rung(self, source, metric, rung, segment_values):
+        with self.results_lock:
+            values = self.results.setdefault(source.path, collections.OrderedDict()).setdefault(metric, {})
+            values[rung] = segment_values
+            if not self.plan.results_store:
+                self.write_rung(source, metric, rung)
+
+    def write_rung(self, source, metric, rung):
+        # ladder order is kept, whatever the order the rungs finish in
+        segments = self.segments(source)
+        values = self.results[source.path][metric]
+        name = self.results_name(source, rung)
+        rungs = [r for r in self.plan.ladders[source].rungs if r in values and self.results_name(source, r) == name]
+        self.write_results(name, metric, dict((r.label, values[r]) for r in rungs))
+        if metric == "psnr" and self.plan.psnr_engine == "numpy":
+            # per-plane and per-frame values of the in-process engine
+            details = dict((r.label, [self.psnr_details[(source, r, j)] for j in segments]) for r in rungs)
+            self.write_results(name, metric, details, "_details")
+
+    def export_results(self, source):
+        """Writes the JSON results of a source once all of them are known, the results store has every value."""
+        with self.results_lock:
+            for metric, values in self.results.get(source.path, {}).items():
+                names = collections.OrderedDict((self.results_name(source, rung), rung) for rung in values)
+                for rung in names.values():
+                    self.write_rung(source, metric, rung)
+
+    def rate_quality_points(self, source, codec, metric):
+        """(kbit/s, quality) of every rung of a codec, the quality of the segments weighted by their duration.
+
+        The bitrate is the one of the segments the quality is computed on, those
+        encoded one by one in the encode segment mode.
+        """
+        segments = self.segments(source)
+        durations = [self.segment_duration(source, j) for j in segments]
+        values = self.results[source.path]
+        points = []
+        for rung in self.plan.ladders[source].rungs:
+            if rung.codec != codec or rung not in values.get(metric, {}):
+                continue
+            bitrate = 8 * sum(values["scored_size" if "scored_size" in values else "size"][rung]) / \
+                float(sum(durations))
+            quality = sum(value * duration for value, duration in zip(values[metric][rung], durations))
+            points.append((bitrate / 1000, quality / sum(durations)))
+        return points
+
+    def compare_codecs(self, source):
+        """Writes the BD-rate and BD-quality of every codec of the ladder against the codec of its first rung."""
+        ladder = self.plan.ladders[source]
+        codecs = []
+        for rung in ladder.rungs:
+            if rung.codec not in codecs:
+                codecs.append(rung.codec)
+        anchor = ladder.anchor_codec
+        metrics = self.plan.metrics
+        curves = collections.OrderedDict((codec, collections.OrderedDict(
+            (metric, self.rate_quality_points(source, codec, metric)) for metric in metrics)) for codec in codecs)
+        comparison = collections.OrderedDict([("anchor", anchor), ("bd_rate", collections.OrderedDict()),
+                                              ("bd_quality", collections.OrderedDict()), ("curves", curves)])
+        for codec in codecs[1:]:
+            comparison["bd_rate"][codec] = collections.OrderedDict(
+                (metric, bd_rate(curves[anchor][metric], curves[codec][metric])) for metric in metrics)
+            comparison["bd_quality"][codec] = collections.OrderedDict(
+                (metric, bd_quality(curves[anchor][metric], curves[codec][metric])) for metric in metrics)
+        with open(source.base_name + "_bdrate.json", 'w') as file:
+            file.write(json.dumps(comparison, sort_keys=False, indent=4, separators=(',', ': ')))
+
+        # bitrate difference at the same quality, quality difference at the same bitrate
+        print("\nBD-rate of %s against %s:" % (source.file_name, anchor))
+        print("%-12s" % "Codec" + "".join("%10s %10s" % (metric.upper(), "BD-" + metric.upper())
+                                          for metric in metrics))
+        for codec in codecs[1:]:
+            print("%-12s" % codec + "".join(
+                "%10s %10s" % ("n/a" if comparison["bd_rate"][codec][metric] is None else
+                               "%+.2f%%" % comparison["bd_rate"][codec][metric],
+                               "n/a" if comparison["bd_quality"][codec][metric] is None else
+                               "%+.3f" % comparison["bd_quality"][codec][metric]) for metric in metrics))
+        return comparison
+
+    def needs_reference(self, source):
+        # the raw reference segments are written once per run and read by every rung and metric
+        plan = self.plan
+        return any(self.segment_source(rung) == "yuv" for rung in plan.ladders[source].rungs) or \
+            (plan.calculate_vmaf and self.metric_engine("vmaf") == "files" and not plan.sampled) or \
+            (plan.calculate_psnr and self.metric_engine("psnr") == "ffmpeg")
+
+    def calibration_segments(self, source):
+        # spread over the whole source
+        segments = self.segments(source)
+        count = min(self.plan.calibration_segments, len(segments)) if self.plan.sampled else 0
+        return [segments[n * len(segments) // count] for n in range(count)]
+
+    def add_jobs(self, source):
+        """Adds the encode -> decode -> metric jobs of every (rung, segment) of a source."""
+        plan = self.plan
+        ladder = plan.ladders[source]
+        segments = self.segments(source)
+        for mode in sorted(set(rung.mode for rung in ladder.rungs)):
+            # every metric result is journaled as soon as it is known
+            self.journals[(source, mode)] = Journal(source.base_name + "_" + mode + "_journal.jsonl", plan.resume)
+        if plan.results_store:
+            self.stores[source] = ResultsStore(source.base_name + "_results.npys", plan.resume)
+        if plan.target_metric:
+            self.add_search_jobs(source)
+            return
+
+        needs_reference = self.needs_reference(source)
+        # codecs are compared on the sizes of the segments their metrics are computed on
+        compared = len(ladder.codecs) > 1 and bool(plan.metrics)
+        calculate_size = plan.calculate_size or compared
+        calibration_segments = self.calibration_segments(source)
+        calibrated = collections.OrderedDict((metric, []) for metric in ("vmaf", "psnr", "ssim", "ms_ssim"))
+        if plan.decode_once:
+            # every rung encode and reference segment is written by the fan-out job, the jobs
+            # registered here under the same keys only find their files already there
+            # under a scratch budget, the reference segments are extracted one by one when there is room
+            fan_out_job = self.scheduler.add(("fan-out", source.path), self.fan_out, source,
+                                             ["yuv"] if needs_reference and not plan.scratch_budget else [])
+            for i in ladder.rungs:
+                self.scheduler.add(("encode", source.path, i.key), self.encode_rung, source, i,
+                                   depends=[fan_out_job])
+            if needs_reference:
+                for j in segments:
+                    self.add_yuv_segment(source, j, "yuv", depends=[fan_out_job])
+
+        for i in ladder.rungs:
+            encode_rung_job = self.scheduler.add(("encode", source.path, i.key), self.encode_rung, source, i)
+            if plan.package:
+                self.scheduler.add(("package", source.path, i.key), self.package_rung, source, i,
+                                   depends=[encode_rung_job])
+            if calculate_size:
+                self.scheduler.add(("size", source.path, i.key), self.calculate_sizes, source, i,
+                                   depends=[encode_rung_job])
+            # the metrics of the encode segment mode are computed on other encodes, measured apart
+            scored_sizes = calculate_size and bool(plan.metrics) and plan.segment_mode == "encode"
+
+            metric_jobs = []
+            segment_jobs = []
+            for j in segments:
+                metrics = plan.metrics
+                for metric in metrics:
+                    record = self.journals[(source, i.mode)].get(self.result_key(metric, source, i, j))
+                    if record is not None:
+                        # already computed by an interrupted run, nothing to encode for it
+                        metric_jobs.append(self.scheduler.add((metric, source.path, i.key, j), self.restore_result,
+                                                              metric, source, i, j, record))
+                pending = [metric for metric in metrics if (metric, source.path, i.key, j) not in self.scheduler.tasks]
+                reference = self.yuv_segment_name(source, j, "yuv")
+                segment = self.encoded_segment_name(source, i, j)
+                # restored segments are still encoded, or fetched from the cache, to be measured
+                encoded = pending or scored_sizes
+                if encoded and needs_reference:
+                    reference_job = self.add_yuv_segment(source, j, "yuv")
+
+                if encoded and plan.segment_mode == "split":
+                    encode_job = self.scheduler.add(("split", source.path, i.key), self.split_rung, source, i,
+                                                    depends=[encode_rung_job])
+                elif encoded and self.segment_source(i) == "yuv":
+                    encode_job = self.add_reader(("encode", source.path, i.key, j), source, [reference],
+                                                 self.encode_segment, source, i, j, True, depends=[reference_job])
+                elif encoded:
+                    encode_job = self.scheduler.add(("encode", source.path, i.key, j), self.encode_segment,
+                                                    source, i, j, False)
+                if encoded:
+                    segment_jobs.append(encode_job)
+
+                # metrics computed each on its own, unless they are all scored in a single pass
+                separate = [] if plan.single_pass else pending
+                if pending and plan.single_pass:
+                    score_job = self.add_reader(("score", source.path, i.key, j), source, [segment],
+                                                self.journaled_scores, pending, source, i, j, depends=[encode_job])
+                    metric_jobs += [self.scheduler.add((metric, source.path, i.key, j), self.score, score_job, metric,
+                                                       depends=[score_job]) for metric in pending]
+
+                if "vmaf" in separate and plan.vmaf_engine != "files":
+                    # decoded frames go straight to the scorer, no .yuv file is written
+                    calculate = self.calculate_vmaf_libvmaf if plan.vmaf_engine == "libvmaf" else \
+                        self.calculate_vmaf_fifo
+                    metric_jobs.append(self.add_reader(("vmaf", source.path, i.key, j), source, [segment],
+                                                       self.journaled, "vmaf", calculate, source, i, j,
+                                                       depends=[encode_job]))
+                elif "vmaf" in separate:
+                    decoded = self.encoded_segment_name(source, i, j, self.decoded_extension())
+                    decode_job = self.add_reader(("decode", source.path, i.key, j), source, [segment],
+                                                 self.decode_segment, source, i, j, depends=[encode_job])
+                    self.scratch_files[decode_job] = (self.working_file(source, decoded),
+                                                      self.raw_size(source, j, self.decoded_extension()))
+                    vmaf_reference, vmaf_reference_job = (reference, reference_job) if not plan.sampled else \
+                        (self.yuv_segment_name(source, j, "sampled.yuv"),
+                         self.add_yuv_segment(source, j, "sampled.yuv"))
+                    metric_jobs.append(self.add_reader(("vmaf", source.path, i.key, j), source,
+                                                       [vmaf_reference, decoded], self.journaled, "vmaf",
+                                                       self.calculate_vmaf, source, i, j,
+                                                       depends=[decode_job, vmaf_reference_job]))
+
+                if "psnr" in separate and plan.psnr_engine == "numpy":
+                    # reference frames are decoded straight from the source, nothing is written to disk
+                    metric_jobs.append(self.add_reader(("psnr", source.path, i.key, j), source, [segment],
+                                                       self.journaled, "psnr", self.calculate_psnr_numpy, source, i,
+                                                       j, depends=[encode_job]))
+                elif "psnr" in separate:
+                    metric_jobs.append(self.add_reader(("psnr", source.path, i.key, j), source, [reference, segment],
+                                                       self.journaled, "psnr", self.calculate_psnr, source, i, j,
+                                                       depends=[encode_job, reference_job]))
+
+                if j in calibration_segments:
+                    # the metrics computed here are also computed exactly, over every frame at full resolution
+                    for metric in pending:
+                        file_names, depends = [segment], [encode_job]
+                        if self.metric_engine(metric) in ("ffmpeg", "files"):
+                            file_names.append(reference)
+                            depends.append(self.add_yuv_segment(source, j, "yuv"))
+                        calibrated[metric].append((self.add_reader(("calibrate", metric, source.path, i.key, j), source,
+                                                                   file_names, self.calibrate, metric, source, i, j,
+                                                                   depends=depends), i, j))
+
+            if scored_sizes:
+                self.add_reader(("scored-size", source.path, i.key), source,
+                                [self.encoded_segment_name(source, i, j) for j in segments],
+                                self.calculate_scored_sizes, source, i, depends=segment_jobs)
+            for metric in plan.metrics:
+                self.scheduler.add(("write", metric, source.path, i.key), self.collect_rung, source, metric, i,
+                                   depends=[key for key in metric_jobs if key[0] == metric])
+            if plan.single_pass and plan.metrics:
+                # the scores of every segment together
+                self.scheduler.add(("write", "score", source.path, i.key), self.collect_scores, source, i,
+                                   depends=metric_jobs)
+
+        for metric, entries in calibrated.items():
+            if entries:
+                self.scheduler.add(("calibration", metric, source.path), self.write_calibration, source, metric,
+                                   entries, depends=[key for key, _, _ in entries] +
+                                   [(metric, source.path, i.key, j) for _, i, j in entries])
+
+        if compared:
+            # once every rung of every codec is measured
+            self.scheduler.add(("compare", source.path), self.compare_codecs, source,
+                               depends=[(stage, source.path, i.key) for i in ladder.rungs for stage in ("size",) +
+                                        (("scored-size",) if plan.segment_mode == "encode" else ())] +
+                               [("write", metric, source.path, i.key) for i in ladder.rungs for metric in plan.metrics])
+
+        if plan.results_store:
+            self.scheduler.add(("export", source.path), self.export_results, source,
+                               depends=[key for key in self.scheduler.tasks
+                                        if key[0] in ("write", "size", "scored-size") and source.path in key])
+
+    def add_search_jobs(self, source):
+        """Adds the searches of the rung reaching the target, one per range of rungs of the ladder.
+
+        Rungs of the same codec, rate control and resolution give the range of a
+        search; it runs for every segment, or once for the whole source.
+        """
+        plan = self.plan
+        segments = self.segments(source)
+        ranges = collections.OrderedDict()
+        for rung in plan.ladders[source].rungs:
+            ranges.setdefault((rung.codec, rung.mode, rung.resolution), []).append(rung)
+
+        needs_reference = self.needs_reference(source)
+        # run_vmaf reads references with the sampled frames only
+        needs_sampled_reference = plan.sampled and plan.target_metric == "vmaf" and plan.vmaf_engine == "files"
+        references = dict((j, []) for j in segments)
+        reference_jobs = dict((j, []) for j in segments)
+        for j in segments:
+            if needs_reference:
+                references[j].append(self.yuv_segment_name(source, j, "yuv"))
+                reference_jobs[j].append(self.add_yuv_segment(source, j, "yuv"))
+            if needs_sampled_reference:
+                references[j].append(self.yuv_segment_name(source, j, "sampled.yuv"))
+                reference_jobs[j].append(self.add_yuv_segment(source, j, "sampled.yuv"))
+        for key, rungs in ranges.items():
+            rungs = search_rungs(rungs)
+            print("Search range for %s: %s to %s, %d rungs" % (source.file_name, rungs[0], rungs[-1], len(rungs)))
+            if plan.target_scope == "title":
+                search_jobs = [self.add_reader(("search", source.path, key), source,
+                                               sum([references[j] for j in segments], []), self.search_title,
+                                               source, rungs,
+                                               depends=sum([reference_jobs[j] for j in segments], []))]
+            else:
+                search_jobs = [self.add_reader(("search", source.path, key, j), source, references[j],
+                                               self.search_segment, source, rungs, j, depends=reference_jobs[j])
+                               for j in segments]
+            self.scheduler.add(("write", "search", source.path, key), self.write_search, source, rungs, search_jobs,
+                               depends=search_jobs)
+
+
+def run(plan):
+    """Runs a plan, returns the metric values of every segment by source path, metric and rung."""
+    return Run(plan).execute()
@@ -0,0 +1,194 @@
+import collections
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+from .cache import write_atomically
+
+
+def usage_values(usage):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS, block counts are 512 bytes
+    return collections.OrderedDict([
+        ("cpu", usage.ru_utime + usage.ru_stime),
+        ("max_rss", usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)),
+        ("read", usage.ru_inblock * 512),
+        ("written", usage.ru_oublock * 512),
+    ])
+
+
+def job_name(key):
+    # the key of a job without the directories of the source, e.g. vmaf tos.y4m libx264 crf 20 4
+    parts = []
+    for part in key:
+        if isinstance(part, tuple):
+            parts += [str(item) for item in part if item is not None]
+        elif isinstance(part, str) and os.sep in part:
+            parts.append(os.path.basename(part))
+        elif part is not None:
+            parts.append(str(part))
+    return " ".join(parts)
+
+
+def format_bytes(size):
+    for unit in ("B", "K", "M", "G"):
+        if size < 1024 or unit == "G":
+            return "%.1f%s" % (size, unit) if unit != "B" else "%d%s" % (size, unit)
+        size /= 1024.0
+
+
+class Profiler(object):
+    """Timings of the jobs of a run and of the commands they run.
+
+    Every job is recorded on the thread it ran on, with the commands it ran and
+    the resources of each (CPU time, peak RSS and block I/O of the child process
+    and of the processes it waited for). ``write`` saves them as a Chrome trace,
+    with the summary of every stage, the critical path and the idle core time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.end = None
+        self.events = []
+        self.lanes = {}
+        self.local = threading.local()
+
+    def lane(self):
+        with self.lock:
+            return self.lanes.setdefault(threading.get_ident(), len(self.lanes) + 1)
+
+    def current_job(self):
+        return getattr(self.local, "job", None)
+
+    @contextlib.contextmanager
+    def attached(self, key):
+        # commands run by helper threads of a job are accounted to the job
+        previous, self.local.job = self.current_job(), key
+        try:
+            yield
+        finally:
+            self.local.job = previous
+
+    def add(self, kind, name, start, end, **values):
+        event = dict(kind=kind, name=name, start=start, end=end, lane=self.lane(), job=self.current_job(),
+                     values=values)
+        with self.lock:
+            self.events.append(event)
+
+    def run_job(self, key, function, *arguments):
+        start = time.time()
+        try:
+            with self.attached(key):
+                return function(*arguments)
+        finally:
+            self.add("job", job_name(key), start, time.time(), key=key)
+
+    def command(self, tool, command_string, start, end, usage):
+        self.add("command", tool, start, end, command=command_string, **usage_values(usage))
+
+    def worker_command(self, tool, command_string, start, end, worker, values):
+        # run by a worker of the queue, the resources are the ones it measured on its host
+        self.add("command", tool, start, end, command=command_string, worker=worker, **values)
+
+    def startup(self, command_string, start, end):
+        self.add("startup", "container startup", start, end, command=command_string)
+
+    def stages(self):
+        """Jobs, wall time and command resources by stage, the first item of the job keys."""
+        stages = collections.OrderedDict()
+
+        def stage(key):
+            return stages.setdefault(key[0] if key else "run", collections.OrderedDict([
+                ("jobs", 0), ("wall", 0.0), ("commands", 0), ("command_wall", 0.0), ("cpu", 0.0), ("max_rss", 0),
+                ("read", 0), ("written", 0), ("startups", 0), ("startup_wall", 0.0)]))
+
+        for event in self.events:
+            values = stage(event["values"]["key"] if event["kind"] == "job" else event["job"])
+            duration = event["end"] - event["start"]
+            if event["kind"] == "job":
+                values["jobs"] += 1
+                values["wall"] += duration
+            elif event["kind"] == "startup":
+                values["startups"] += 1
+                values["startup_wall"] += duration
+            else:
+                values["commands"] += 1
+                values["command_wall"] += duration
+                values["cpu"] += event["values"]["cpu"]
+                values["max_rss"] = max(values["max_rss"], event["values"]["max_rss"])
+                values["read"] += event["values"]["read"]
+                values["written"] += event["values"]["written"]
+        return stages
+
+    def critical_path(self, tasks):
+        """Longest chain of dependent jobs, ``tasks`` are the scheduler jobs in the order they were added."""
+        durations = dict((event["values"]["key"], event["end"] - event["start"]) for event in self.events
+                         if event["kind"] == "job")
+        finish = {}
+        previous = {}
+        for key, (_, _, depends) in tasks.items():
+            before = max(depends, key=lambda dependency: finish[dependency]) if depends else None
+            finish[key] = durations.get(key, 0.0) + (finish[before] if before is not None else 0.0)
+            previous[key] = before
+        key = max(finish, key=lambda item: finish[item]) if finish else None
+        length = finish[key] if key is not None else 0.0
+        path = []
+        while key is not None:
+            path.append(key)
+            key = previous[key]
+        return length, [job_name(key) for key in reversed(path)]
+
+    def summary(self, tasks, workers):
+        wall = (self.end or time.time()) - self.start
+        busy = sum(event["end"] - event["start"] for event in self.events if event["kind"] == "job")
+        length, path = self.critical_path(tasks)
+        return collections.OrderedDict([
+            ("wall", wall),
+            ("workers", workers),
+            ("busy", busy),
+            # worker time spent waiting for a job to be ready
+            ("idle", max(0.0, workers * wall - busy)),
+            ("critical_path", collections.OrderedDict([("duration", length), ("jobs", path)])),
+            ("stages", self.stages()),
+        ])
+
+    def trace_events(self):
+        events = [dict(name="thread_name", ph="M", pid=1, tid=lane, args=dict(name="thread %d" % lane))
+                  for lane in sorted(self.lanes.values())]
+        for event in sorted(self.events, key=lambda item: (item["start"], -item["end"])):
+            arguments = dict((name, value) for name, value in event["values"].items() if name != "key")
+            if event["job"] is not None:
+                arguments["job"] = job_name(event["job"])
+            events.append(dict(name=event["name"], cat=event["kind"], ph="X", pid=1, tid=event["lane"],
+                               ts=int((event["start"] - self.start) * 1000000),
+                               dur=int((event["end"] - event["start"]) * 1000000), args=arguments))
+        return events
+
+    def write(self, file_name, tasks, workers):
+        """Writes the Chrome trace (chrome://tracing, Perfetto), the summary of the run in its own member."""
+        self.end = self.end or time.time()
+        summary = self.summary(tasks, workers)
+        write_atomically(file_name, json.dumps(collections.OrderedDict([
+            ("traceEvents", self.trace_events()),
+            ("displayTimeUnit", "ms"),
+            ("summary", summary),
+        ])))
+        return summary
+
+    def report(self, summary):
+        print("\n-----")
+        print("%-12s %5s %9s %9s %9s %9s %9s %9s" % ("Stage", "Jobs", "Wall", "Commands", "CPU", "Peak RSS",
+                                                    "Read", "Written"))
+        for stage, values in summary["stages"].items():
+            print("%-12s %5d %8.2fs %8.2fs %8.2fs %9s %9s %9s" % (
+                stage, values["jobs"], values["wall"], values["command_wall"], values["cpu"],
+                format_bytes(values["max_rss"]), format_bytes(values["read"]), format_bytes(values["written"])))
+        print("Run: %.2fs on %d workers, %.2fs busy, %.2fs idle (%.1f%%)" % (
+            summary["wall"], summary["workers"], summary["busy"], summary["idle"],
+            100.0 * summary["idle"] / (summary["workers"] * summary["wall"]) if summary["wall"] else 0.0))
+        print("Critical path: %.2fs, %d jobs: %s" % (summary["critical_path"]["duration"],
+                                                    len(summary["critical_path"]["jobs"]),
+                                                    " -> ".join(summary["critical_path"]["jobs"])))
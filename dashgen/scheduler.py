@@ -0,0 +1,70 @@
+import collections
+import concurrent.futures
+import threading
+
+
+class Scheduler(object):
+    """Runs a graph of dependent jobs on a bounded pool of worker threads.
+
+    Jobs are identified by a key; adding a key twice returns the existing job, so
+    work shared by several rungs (e.g. reference segments) is only done once.
+    Jobs are started in the order they were added, or sorted by ``order``, as
+    soon as their dependencies have finished. ``admit(key, force)`` can hold a
+    ready job back; when nothing else can run, the first job held back is forced.
+    """
+
+    def __init__(self, jobs=1, profiler=None, admit=None, order=None):
+        self.jobs = max(1, jobs)
+        self.tasks = collections.OrderedDict()
+        self.results = {}
+        # every job is timed by the profiler when there is one
+        self.profiler = profiler
+        self.admit = admit
+        self.order = order
+        self.local = threading.local()
+
+    def add(self, key, function, *arguments, depends=()):
+        if key not in self.tasks:
+            for dependency in depends:
+                if dependency not in self.tasks:
+                    raise KeyError("Unknown dependency %r for job %r" % (dependency, key))
+            self.tasks[key] = (function, arguments, tuple(depends))
+        return key
+
+    def start(self, executor, pending, running, force=False):
+        for key, (function, arguments, depends) in list(pending.items()):
+            if len(running) >= self.jobs or (force and running):
+                break
+            if all(dependency in self.results for dependency in depends) and \
+                    (self.admit is None or self.admit(key, force)):
+                del pending[key]
+                running[executor.submit(self.run_job, key, function, *arguments)] = key
+
+    def run_job(self, key, function, *arguments):
+        self.local.job = key
+        try:
+            if self.profiler:
+                return self.profiler.run_job(key, function, *arguments)
+            return function(*arguments)
+        finally:
+            self.local.job = None
+
+    def current_job(self):
+        return getattr(self.local, "job", None)
+
+    def run(self):
+        results = self.results
+        pending = collections.OrderedDict(sorted(self.tasks.items(), key=lambda item: self.order(item[0]))
+                                          if self.order else self.tasks)
+        running = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while pending or running:
+                self.start(executor, pending, running)
+                if pending and not running:
+                    self.start(executor, pending, running, force=True)
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    # re-raises the job exception, the executor waits for the running jobs
+                    results[key] = future.result()
+        return results
@@ -0,0 +1,71 @@
+import collections
+import math
+
+from .ladder import Rung
+
+
+def parse_bitrate(bitrate):
+    # ffmpeg bitrate suffixes are decimal: 500k, 1.5M, 500kbps
+    units = {"k": 1000, "m": 1000000, "g": 1000000000}
+    text = str(bitrate).strip().lower()
+    if text.endswith("bps"):
+        text = text[:-3]
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(float(text))
+
+
+def search_rungs(rungs, steps_per_octave=8):
+    """Rungs a search can probe, from the best quality to the smallest encode.
+
+    The lowest and highest value of ``rungs`` bound the search: every CRF in
+    between, or bitrates spaced by ``1 / steps_per_octave`` of an octave.
+    """
+    first = rungs[0]
+    if first.mode == "crf":
+        crfs = range(min(rung.crf for rung in rungs), max(rung.crf for rung in rungs) + 1)
+        return [Rung(first.codec, crf=crf, resolution=first.resolution) for crf in crfs]
+    bitrates = [parse_bitrate(rung.bitrate) for rung in rungs]
+    low, high = min(bitrates), max(bitrates)
+    steps = max(1, int(round(math.log(float(high) / low, 2) * steps_per_octave))) if high > low else 1
+    kilobits = sorted(set(int(round(high * (float(low) / high) ** (float(step) / steps) / 1000))
+                          for step in range(steps + 1)), reverse=True)
+    return [Rung(first.codec, bitrate="%dk" % value, resolution=first.resolution) for value in kilobits]
+
+
+def search(measure, count, target, tolerance=0.5, max_probes=6):
+    """Finds the probe whose quality is closest above ``target``.
+
+    ``measure(index)`` gives the quality of the probe ``index`` out of ``count``,
+    it must not increase with the index. The search stops as soon as a probe is
+    within ``tolerance`` of the target, otherwise it interpolates between the
+    closest probes on both sides of it. Returns the index chosen, its quality and
+    every probe made by index.
+    """
+    probes = collections.OrderedDict()
+    # highest index reaching the target and lowest index missing it
+    above = below = None
+    index = (count - 1) // 2
+    while index not in probes and len(probes) < max_probes:
+        value = probes[index] = measure(index)
+        if abs(value - target) <= tolerance:
+            return index, value, probes
+        if value >= target:
+            above = index if above is None else max(above, index)
+        else:
+            below = index if below is None else min(below, index)
+
+        if above is not None and below is not None:
+            if below - above <= 1:
+                break
+            # quality is roughly linear in the CRF and in the logarithm of the bitrate
+            position = above + (probes[above] - target) * (below - above) / (probes[above] - probes[below])
+            index = min(max(int(round(position)), above + 1), below - 1)
+        elif above is not None:
+            index = count - 1
+        else:
+            index = 0
+
+    # the smallest encode reaching the target, or the best quality when none does
+    chosen = above if above is not None else min(probes)
+    return chosen, probes[chosen], probes
@@ -0,0 +1,52 @@
+import collections
+import math
+import re
+
+
+def fixed_segments(duration, segment_size):
+    # the tail shorter than a segment is dropped
+    return collections.OrderedDict((start, segment_size) for start in range(0, int(duration), segment_size))
+
+
+def start_time_format(start_time):
+    # 004 for fixed segments, 004.250 for scene segments
+    if isinstance(start_time, float):
+        return ("%.3f" % start_time).zfill(7)
+    return str(start_time).zfill(3)
+
+
+def scene_cuts(showinfo_output):
+    """Times of the frames selected by the scene filter, from showinfo log lines."""
+    return sorted(set(float(time) for time in re.findall(r"pts_time:\s*(-?[0-9.]+)", showinfo_output)))
+
+
+def frame_time(time, frames_per_second):
+    # boundaries fall on frames, written with a millisecond precision
+    return round(round(time * frames_per_second) / float(frames_per_second), 3)
+
+
+def split_evenly(start, end, maximum, frames_per_second):
+    parts = int(math.ceil((end - start) / float(maximum) - 1e-9))
+    return [frame_time(start + (end - start) * part / parts, frames_per_second) for part in range(1, parts)]
+
+
+def scene_segments(cuts, duration, minimum, maximum, frames_per_second):
+    """Segments starting on the scene cuts, from ``minimum`` to ``maximum`` seconds long.
+
+    Cuts closer than ``minimum`` to the previous boundary are skipped and shots
+    longer than ``maximum`` are split evenly. The last segment runs to the end of
+    the video, a tail shorter than ``minimum`` is merged into the segment before.
+    Returns the duration of every segment by start time.
+    """
+    starts = [0.0]
+    for cut in [frame_time(cut, frames_per_second) for cut in cuts if 0 < cut < duration] + [duration]:
+        if cut - starts[-1] < minimum:
+            continue
+        starts += split_evenly(starts[-1], cut, maximum, frames_per_second)
+        if cut < duration:
+            starts.append(cut)
+    if len(starts) > 1 and duration - starts[-1] < minimum:
+        starts.pop()
+    starts += split_evenly(starts[-1], duration, maximum, frames_per_second)
+    ends = starts[1:] + [duration]
+    return collections.OrderedDict((start, round(end - start, 3)) for start, end in zip(starts, ends))
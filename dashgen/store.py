@@ -0,0 +1,77 @@
+import os
+import threading
+
+from .metrics import numpy
+
+# one row per value, segments by start time, the values of a whole segment have frame -1
+columns = [("source", "U"), ("codec", "U"), ("mode", "U"), ("rung", "U"), ("resolution", "U"),
+           ("segment", "f8"), ("frame", "i4"), ("metric", "U"), ("value", "f8")]
+
+
+def rows_dtype(rows):
+    # strings are stored with the width of the longest one of the chunk
+    return numpy.dtype([(name, "U%d" % max([len(row[index]) for row in rows] + [1]) if kind == "U" else kind)
+                        for index, (name, kind) in enumerate(columns)])
+
+
+def read_chunks(file_name):
+    """Yields the chunks of a results file with the offset they end at, up to an incomplete last one."""
+    with open(file_name, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        while file.tell() < size:
+            try:
+                chunk = numpy.load(file, allow_pickle=False)
+            except (ValueError, EOFError, OSError):
+                return
+            yield chunk, file.tell()
+
+
+class ResultsStore(object):
+    """Append-only columnar file of every value computed by a run.
+
+    The file is a sequence of structured numpy arrays (one ``numpy.save`` per
+    append) with the ``columns`` above. Like the journal, every chunk is synced
+    to disk as soon as it is written; a resumed run drops an incomplete last
+    chunk and skips the rows the file already has.
+    """
+
+    def __init__(self, file_name, resume=False):
+        self.file_name = file_name
+        self.lock = threading.Lock()
+        self.keys = set()
+        if resume and os.path.isfile(file_name):
+            self.load()
+        self.file = open(file_name, 'ab' if resume else 'wb')
+
+    def load(self):
+        valid_size = 0
+        for chunk, valid_size in read_chunks(self.file_name):
+            self.keys.update(tuple(row)[:-1] for row in chunk.tolist())
+        if valid_size != os.path.getsize(self.file_name):
+            print("Dropping incomplete results chunk: %s" % self.file_name)
+            os.truncate(self.file_name, valid_size)
+        print("Stored results: %d" % len(self.keys))
+
+    def append(self, rows):
+        with self.lock:
+            rows = [row for row in rows if tuple(row[:-1]) not in self.keys]
+            if not rows:
+                return
+            self.keys.update(tuple(row[:-1]) for row in rows)
+            numpy.save(self.file, numpy.array(rows, dtype=rows_dtype(rows)), allow_pickle=False)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def load_results(*file_names):
+    """Loads the rows of results files, of one or many runs, into a single structured array."""
+    chunks = [chunk for file_name in file_names for chunk, _ in read_chunks(file_name)]
+    if not chunks:
+        return numpy.zeros(0, dtype=rows_dtype([]))
+    # string columns are widened to the widest chunk
+    dtype = numpy.dtype([(name, max((chunk.dtype[name] for chunk in chunks), key=lambda field: field.itemsize))
+                         for name, _ in columns])
+    return numpy.concatenate([chunk.astype(dtype) for chunk in chunks])
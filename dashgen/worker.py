@@ -0,0 +1,159 @@
+"""Workers running the commands queued by dashgen runs with --queue-dir.
+
+    python -m dashgen.worker /shared/dashgen-queue -j 8
+
+The queue directory and the videos must be on a filesystem every host mounts
+at the same path. A worker runs each command with the backend its run was
+started with (docker, pool or native), renews the leases of the commands it
+runs every ``--heartbeat`` seconds and writes their output and exit code back.
+Workers can be started and stopped at any time: the leases of a stopped worker
+expire and its commands are given to another one.
+"""
+
+import argparse
+import base64
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from .backends import create_backend
+from .profile import usage_values
+from .workqueue import WorkQueue
+
+
+class UsageRecorder(object):
+    """Stands for the profiler of the backends, keeps the resources of the last command of every thread."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def command(self, tool, command_string, start, end, usage):
+        self.local.values = usage_values(usage)
+
+    def startup(self, command_string, start, end):
+        pass
+
+
+class Worker(object):
+    """Claims the tasks of the queue, ``jobs`` at a time, until it is stopped or idle for ``idle_exit`` seconds."""
+
+    def __init__(self, queue, name, jobs=1, heartbeat=5.0, poll=0.5, idle_exit=None):
+        self.queue = queue
+        self.name = name
+        self.jobs = max(1, jobs)
+        self.heartbeat = heartbeat
+        self.poll = poll
+        self.idle_exit = idle_exit
+        self.lock = threading.Lock()
+        self.recorder = UsageRecorder()
+        # one backend by name, the tasks of a run name the one it was started with
+        self.backends = {}
+        self.leases = set()
+        self.done = 0
+        self.last_task = time.time()
+        self.stopping = threading.Event()
+
+    def backend(self, name):
+        with self.lock:
+            if name not in self.backends:
+                self.backends[name] = create_backend(name, self.jobs)
+                self.backends[name].profiler = self.recorder
+            return self.backends[name]
+
+    def execute(self, name, task):
+        start = time.time()
+        self.recorder.local.values = None
+        print("Task %s: %s" % (name, task["job"] or task["tool"]))
+        try:
+            output = self.backend(task["backend"]).run(task["tool"], task["arguments"], task["directory"])
+            return_code = 0
+        except subprocess.CalledProcessError as error:
+            output, return_code = error.output or b"", error.returncode
+        except Exception as error:
+            # the run gets the error as the output of a failed command
+            output, return_code = ("%s: %s" % (type(error).__name__, error)).encode(), 1
+        self.queue.complete(name, dict(worker=self.name, return_code=return_code,
+                                       output=base64.b64encode(output).decode(), start=start, end=time.time(),
+                                       usage=self.recorder.local.values))
+
+    def work(self):
+        while not self.stopping.is_set():
+            claimed = self.queue.claim()
+            if claimed is None:
+                self.stopping.wait(self.poll)
+                continue
+            name, task = claimed
+            with self.lock:
+                self.leases.add(name)
+            try:
+                self.execute(name, task)
+            finally:
+                with self.lock:
+                    self.leases.discard(name)
+                    self.done += 1
+                    self.last_task = time.time()
+
+    def beat(self):
+        with self.lock:
+            leases = list(self.leases)
+        for name in leases:
+            if not self.queue.heartbeat(name):
+                # given to another worker, the first result is the one kept
+                print("Lease lost: %s" % name)
+                with self.lock:
+                    self.leases.discard(name)
+        self.queue.register_worker(self.name, dict(host=socket.gethostname(), pid=os.getpid(), jobs=self.jobs,
+                                                   running=len(leases), done=self.done))
+
+    def idle(self):
+        with self.lock:
+            return not self.leases and time.time() - self.last_task > self.idle_exit
+
+    def run(self):
+        print("Worker %s on %s, %d jobs" % (self.name, self.queue.directory, self.jobs))
+        threads = [threading.Thread(target=self.work, name="worker-%d" % index) for index in range(self.jobs)]
+        for thread in threads:
+            thread.start()
+        try:
+            self.beat()
+            while not self.stopping.wait(self.heartbeat):
+                self.beat()
+                if self.idle_exit is not None and self.idle():
+                    print("Idle for %ds, exiting" % self.idle_exit)
+                    self.stopping.set()
+        except KeyboardInterrupt:
+            # the commands running are left to finish
+            self.stopping.set()
+        finally:
+            self.stopping.set()
+            for thread in threads:
+                thread.join()
+            for backend in self.backends.values():
+                backend.stop()
+        print("Worker %s done: %d tasks" % (self.name, self.done))
+
+
+parser = argparse.ArgumentParser(description='Run the commands queued by dashgen runs')
+parser.add_argument('queue_dir', help='Queue directory shared with the runs (--queue-dir)')
+parser.add_argument('-j', '--jobs', help='Number of commands run in parallel', type=int, default=1)
+parser.add_argument('--name', help='Name of the worker in the queue (default: host-pid)', type=str)
+parser.add_argument('--heartbeat', help='Seconds between two renewals of the leases, well below the lease timeout '
+                                        'of the runs', type=float, default=5.0)
+parser.add_argument('--poll', help='Seconds between two looks for tasks when the queue is empty', type=float,
+                    default=0.5)
+parser.add_argument('--idle-exit', help='Exit after this many seconds without any task', type=float)
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    worker = Worker(WorkQueue(args.queue_dir), args.name or "%s-%d" % (socket.gethostname(), os.getpid()),
+                    args.jobs, args.heartbeat, args.poll, args.idle_exit)
+    worker.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+
+from .cache import remove_files, write_atomically
+
+queue_directories = ("tasks", "leases", "results", "workers")
+
+
+class WorkQueue(object):
+    """Commands handed from coordinators to workers through a directory that all of them mount.
+
+    A coordinator writes every command as a task in ``tasks``. A worker claims
+    one by renaming it into ``leases``, which only one worker can do, keeps the
+    lease alive by touching it and writes the outcome in ``results``. Task
+    names start with the time they were submitted at, so they are claimed in
+    order, and with the run they belong to, so runs can share the workers.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        for name in queue_directories:
+            os.makedirs(os.path.join(self.directory, name), exist_ok=True)
+
+    def path(self, kind, name):
+        return os.path.join(self.directory, kind, name)
+
+    def names(self, kind, prefix=""):
+        # files being written have a .tmp- suffix until they are renamed
+        return sorted(name for name in os.listdir(os.path.join(self.directory, kind))
+                      if name.endswith(".json") and prefix in name)
+
+    def read(self, kind, name):
+        try:
+            with open(self.path(kind, name)) as file:
+                return json.load(file)
+        except (IOError, ValueError):
+            # removed, or renamed away, since it was listed
+            return None
+
+    def submit(self, name, task):
+        write_atomically(self.path("tasks", name), json.dumps(task))
+
+    def claim(self):
+        """Leases the oldest task, returns its name and content or None when there is none."""
+        for name in self.names("tasks"):
+            try:
+                os.rename(self.path("tasks", name), self.path("leases", name))
+            except OSError:
+                # claimed by another worker
+                continue
+            # the lease is timed from the claim, not from the submission
+            if self.heartbeat(name):
+                task = self.read("leases", name)
+                if task is not None:
+                    return name, task
+        return None
+
+    def heartbeat(self, name):
+        """Renews a lease, False when it was lost and the task given to another worker."""
+        try:
+            os.utime(self.path("leases", name))
+            return True
+        except OSError:
+            return False
+
+    def complete(self, name, result):
+        write_atomically(self.path("results", name), json.dumps(result))
+        remove_files(self.path("leases", name))
+
+    def take_result(self, name):
+        result = self.read("results", name)
+        remove_files(self.path("results", name))
+        return result
+
+    def leases(self, prefix):
+        """Name and time of the last heartbeat of the leases of a run."""
+        leases = []
+        for name in self.names("leases", prefix):
+            try:
+                leases.append((name, os.path.getmtime(self.path("leases", name))))
+            except OSError:
+                pass
+        return leases
+
+    def requeue(self, name, attempt):
+        """Puts a task whose lease expired back in the queue, returns it or None when it just completed."""
+        task = self.read("leases", name)
+        if task is None:
+            return None
+        task["attempt"] = attempt
+        self.submit(name, task)
+        remove_files(self.path("leases", name))
+        return task
+
+    def cancel(self, name):
+        remove_files(self.path("tasks", name), self.path("leases", name), self.path("results", name))
+
+    def register_worker(self, worker, values):
+        write_atomically(self.path("workers", worker + ".json"), json.dumps(values))
+
+    def workers(self, timeout):
+        """Workers whose last heartbeat is more recent than ``timeout`` seconds."""
+        now = time.time()
+        workers = []
+        for name in self.names("workers"):
+            try:
+                if now - os.path.getmtime(self.path("workers", name)) < timeout:
+                    workers.append(name[:-len(".json")])
+            except OSError:
+                pass
+        return workers
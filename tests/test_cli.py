@@ -0,0 +1,57 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+from dashgen.cli import main
+from dashgen.ladder import codecs
+
+
+class CliTest(unittest.TestCase):
+
+    def error(self, *arguments):
+        """Message of the parser error the command line gives."""
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(SystemExit) as raised:
+                main(["tos.y4m", "-c", "libx264", "-q", "30", "-ss", "2", "-psnr"] + list(arguments))
+        self.assertEqual(raised.exception.code, 2)
+        return stderr.getvalue().strip().splitlines()[-1]
+
+    def plan(self, *arguments):
+        """Plan the command line would run."""
+        with mock.patch("dashgen.cli.run") as run, contextlib.redirect_stdout(io.StringIO()):
+            main(list(arguments))
+        return run.call_args[0][0]
+
+    def test_video_after_codec(self):
+        plan = self.plan("-c", "libx264", "tos.y4m", "-q", "30", "-ss", "2", "-psnr")
+        self.assertEqual([source.file_name for source in plan.sources], ["tos.y4m"])
+        self.assertEqual(plan.ladders[plan.sources[0]].codecs, ["libx264"])
+
+    def test_several_codecs(self):
+        for arguments in (["-c", "libx264,libx265"], ["-c", "libx264", "-c", "libx265"]):
+            plan = self.plan(*arguments + ["tos.y4m", "-q", "30", "-ss", "2", "-psnr"])
+            self.assertEqual([str(rung) for rung in plan.ladders[plan.sources[0]].rungs],
+                             ["libx264 crf: 30", "libx265 crf: 30"])
+
+    def test_invalid_plans_are_parser_errors(self):
+        self.assertIn("Invalid metric frame step: 0", self.error("--metric-frame-step", "0"))
+        self.assertIn("Invalid scratch budget: 12Q", self.error("--scratch-budget", "12Q"))
+        self.assertIn("encode segment mode", self.error("--target-metric", "psnr", "--target-value", "40",
+                                                        "--decode-once"))
+        self.assertIn("Invalid resolution: 72op", self.error("-r", "72op"))
+        self.assertIn("Unknown codec: librav1e", self.error("-c", "librav1e"))
+
+    def test_codec_container_adds_a_codec(self):
+        try:
+            # an invalid plan once the codec is known
+            self.assertIn("Invalid metric frame step", self.error("-c", "librav1e", "--codec-container",
+                                                                  "librav1e=mkv", "--metric-frame-step", "0"))
+            self.assertEqual(codecs["librav1e"].extension, "mkv")
+        finally:
+            codecs.pop("librav1e", None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,236 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from dashgen.benchmark import SimulatedBackend, generate_sources, parse_clip, redirected_output
+from dashgen.ladder import Ladder, Plan, Rung, Source
+from dashgen.pipeline import Run
+
+
+class OldFfmpegBackend(SimulatedBackend):
+    """The simulated backend, as the ffmpeg 3.2 of the default docker image."""
+
+    def answer(self, tool, arguments, words, current_dir):
+        if "-version" in words:
+            return b"ffmpeg version 3.2.4 Copyright (c) 2000-2017 the FFmpeg developers"
+        return super(OldFfmpegBackend, self).answer(tool, arguments, words, current_dir)
+
+
+class ProbeRecordingBackend(SimulatedBackend):
+    """The simulated backend, keeps the files whose packets were read."""
+
+    probed = []
+
+    def answer(self, tool, arguments, words, current_dir):
+        if tool == "ffprobe" and "-show_streams" not in words:
+            self.probed.append(os.path.basename(words[-1]))
+        return super(ProbeRecordingBackend, self).answer(tool, arguments, words, current_dir)
+
+
+class ConcurrencyBackend(SimulatedBackend):
+    """The simulated backend, keeps the highest number of commands it ran at the same time."""
+
+    lock = threading.Lock()
+    running = peak = 0
+
+    def answer(self, tool, arguments, words, current_dir):
+        cls = ConcurrencyBackend
+        with cls.lock:
+            cls.running += 1
+            cls.peak = max(cls.peak, cls.running)
+        try:
+            time.sleep(0.002)
+            return super(ConcurrencyBackend, self).answer(tool, arguments, words, current_dir)
+        finally:
+            with cls.lock:
+                cls.running -= 1
+
+
+class SegmentMuxerBackend(SimulatedBackend):
+    """The simulated backend with the segment muxer, which writes a part after every cut."""
+
+    cuts = []
+
+    def answer(self, tool, arguments, words, current_dir):
+        if "segment" in words and "-segment_times" in words:
+            times = [float(time) for time in words[words.index("-segment_times") + 1].split(",")]
+            self.cuts.append(times)
+            # the last part runs to the end of the encode
+            clip = self.clip(words[words.index("-i") + 1])
+            for part in range(len([time for time in times if time < clip["duration"]]) + 1):
+                open(words[-1] % part, "wb").close()
+            return b""
+        return super(SegmentMuxerBackend, self).answer(tool, arguments, words, current_dir)
+
+
+class DecodeRecordingBackend(SegmentMuxerBackend):
+    """The simulated backend with the segment muxer, keeps the ffmpeg commands reading the source."""
+
+    decodes = []
+
+    def answer(self, tool, arguments, words, current_dir):
+        if tool == "ffmpeg" and any(word.endswith(".y4m") for word in words):
+            self.decodes.append(arguments)
+        return super(DecodeRecordingBackend, self).answer(tool, arguments, words, current_dir)
+
+
+def simulated_run(directory, rungs=None, clip="360p:8", segment_size=2, backend_class=SimulatedBackend, **options):
+    """Runs a plan on a synthetic source with the simulated backend, returns the run once it is done."""
+    clip = parse_clip(clip)
+    sources = generate_sources([clip], directory, "simulated")
+    plan = Plan(cache_dir=os.path.join(directory, "cache"), **options)
+    plan.add(Source(sources[0]), Ladder(rungs or [Rung("libx264", crf=23), Rung("libx264", crf=30)], segment_size))
+    run = Run(plan, backend_class({clip["name"]: clip}, latency=0.0, jitter=0.0))
+    working_directory = os.getcwd()
+    os.chdir(directory)
+    try:
+        with redirected_output(os.path.join(directory, "run.log")):
+            run.execute()
+    finally:
+        os.chdir(working_directory)
+    return run
+
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="dashgen_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_clean_run_leaves_no_raw_segments_in_cache(self):
+        run = simulated_run(self.directory, calculate_psnr=True, calculate_vmaf=True, clean=True, jobs=3)
+        source = run.plan.sources[0]
+        cache = run.cache(source)
+        raw_keys = []
+        for j in run.segments(source):
+            raw_keys.append(run.reference_key(source, j, "yuv"))
+            raw_keys += [run.segment_key(source, rung, j, run.decoded_extension())
+                         for rung in run.plan.ladders[source].rungs]
+        self.assertEqual([key for key in raw_keys if os.path.exists(cache.path(key))], [])
+        self.assertEqual([name for name in os.listdir(self.directory) if name.endswith(".yuv")], [])
+        # the encodes are still cached
+        for rung in run.plan.ladders[source].rungs:
+            self.assertTrue(os.path.exists(cache.path(run.rung_key(source, rung))))
+
+    def test_webm_packaging_is_refused_with_ffmpeg_3(self):
+        with self.assertRaises(ValueError) as raised:
+            simulated_run(self.directory, [Rung("vp9", crf=40)], calculate_psnr=True, package=True,
+                          backend_class=OldFfmpegBackend)
+        self.assertIn("ffmpeg 4", str(raised.exception))
+        # nothing was encoded
+        self.assertEqual([name for name in os.listdir(self.directory) if name.endswith(".webm")], [])
+
+    def test_scored_segment_sizes_are_reported_apart(self):
+        del ProbeRecordingBackend.probed[:]
+        run = simulated_run(self.directory, calculate_psnr=True, calculate_size=True, clean=True,
+                            backend_class=ProbeRecordingBackend)
+        source = run.plan.sources[0]
+        rungs = run.plan.ladders[source].rungs
+        # a single pass over the delivered encode of every rung, and the segments the metrics are computed on
+        delivered = sorted(run.encoded_name(source, rung) for rung in rungs)
+        scored = sorted(run.encoded_segment_name(source, rung, j) for rung in rungs for j in run.segments(source))
+        self.assertEqual(sorted(ProbeRecordingBackend.probed), sorted(delivered + scored))
+        values = run.results[source.path]
+        self.assertEqual([len(values[metric][rung]) for metric in ("size", "scored_size") for rung in rungs],
+                         [4, 4, 4, 4])
+        self.assertNotEqual(values["size"], values["scored_size"])
+        self.assertTrue(os.path.exists(os.path.join(self.directory, source.base_name + "_crf_scored_size.json")))
+
+        # the segments of a resumed run are measured again, none is left behind
+        del ProbeRecordingBackend.probed[:]
+        simulated_run(self.directory, calculate_psnr=True, calculate_size=True, clean=True, resume=True,
+                      backend_class=ProbeRecordingBackend)
+        self.assertEqual(sorted(ProbeRecordingBackend.probed), sorted(delivered + scored))
+        self.assertEqual([name for name in os.listdir(self.directory) if name in scored], [])
+
+    def test_title_search_runs_within_the_jobs(self):
+        ConcurrencyBackend.peak = 0
+        rungs = [Rung("libx264", crf=crf, resolution=resolution) for resolution in ("360p", "240p")
+                 for crf in (20, 40)]
+        run = simulated_run(self.directory, rungs, "360p:16", calculate_psnr=True, target_metric="psnr",
+                            target_value=40, target_scope="title", jobs=2, backend_class=ConcurrencyBackend)
+        self.assertEqual(len(run.results[run.plan.sources[0].path]["search"]), 2)
+        self.assertLessEqual(ConcurrencyBackend.peak, 2)
+
+    def test_calibration_leaves_the_decode_of_another_metric(self):
+        run = simulated_run(self.directory, calculate_psnr=True, calculate_vmaf=True, clean=True)
+        source = run.plan.sources[0]
+        rung = run.plan.ladders[source].rungs[0]
+        j = run.segments(source)[0]
+        # the exact decode of the VMAF calibration, still being read
+        decoded = run.working_file(source, run.encoded_segment_name(source, rung, j, "yuv"))
+        open(decoded, "wb").close()
+        with redirected_output(os.path.join(self.directory, "run.log")):
+            run.calibrate("psnr", source, rung, j)
+        self.assertTrue(os.path.exists(decoded))
+
+    def test_producers_start_when_their_files_fit(self):
+        run = Run(Plan(scratch_budget="1M"), SimulatedBackend({}, latency=0.0, jitter=0.0))
+        sizes = [("reference", 0, 300000), ("reference", 2, 300000), ("decode", 4, 600000), ("reference", 4, 100000)]
+        keys = []
+        for kind, start_time, size in sizes:
+            key = run.scheduler.add((kind, "source", start_time), len)
+            file_name = os.path.join(self.directory, "%s_%d.yuv" % (kind, start_time))
+            run.scratch_files[key] = (file_name, size)
+            run.shared_files.use(file_name)
+            keys.append(key)
+        # a later producer does not wait for an earlier one that is not ready yet
+        self.assertTrue(run.admit(keys[1]))
+        # but leaves it the room it needs
+        self.assertFalse(run.admit(keys[2]))
+        self.assertFalse(run.admit(keys[3]))
+        self.assertTrue(run.admit(keys[0]))
+        self.assertFalse(run.admit(keys[2]))
+        self.assertTrue(run.admit(keys[2], force=True))
+        self.assertEqual(run.shared_files.peak, 1200000)
+
+    def test_codecs_are_compared_on_the_scored_segments(self):
+        del ProbeRecordingBackend.probed[:]
+        rungs = [Rung(codec, crf=crf) for codec in ("libx264", "libx265") for crf in (23, 30, 37)]
+        run = simulated_run(self.directory, rungs, calculate_psnr=True, backend_class=ProbeRecordingBackend)
+        source = run.plan.sources[0]
+        segments = run.segments(source)
+        self.assertEqual(sorted(name for name in ProbeRecordingBackend.probed if name not in
+                                [run.encoded_name(source, rung) for rung in rungs]),
+                         sorted(run.encoded_segment_name(source, rung, j) for rung in rungs for j in segments))
+        with open(os.path.join(self.directory, source.base_name + "_bdrate.json")) as file:
+            curves = json.load(file)["curves"]
+        sizes = run.results[source.path]["scored_size"]
+        duration = sum(run.segment_duration(source, j) for j in segments)
+        self.assertEqual([rate for rate, _ in curves["libx264"]["psnr"]],
+                         [8 * sum(sizes[rung]) / duration / 1000 for rung in rungs[:3]])
+
+    def test_split_segments_end_like_the_encoded_ones(self):
+        del SegmentMuxerBackend.cuts[:]
+        run = simulated_run(self.directory, [Rung("libx264", crf=30)], "360p:8.5", 4, calculate_psnr=True,
+                            segment_mode="split", backend_class=SegmentMuxerBackend)
+        source = run.plan.sources[0]
+        # the half second after the last segment is cut off and dropped
+        self.assertEqual(SegmentMuxerBackend.cuts, [[4, 8]])
+        self.assertEqual(run.segments(source), [0, 4])
+        self.assertEqual([name for name in os.listdir(self.directory) if "_part" in name], [])
+
+    def test_decode_once_decodes_the_source_once(self):
+        del DecodeRecordingBackend.decodes[:]
+        run = simulated_run(self.directory, calculate_psnr=True, decode_once=True, clean=True,
+                            backend_class=DecodeRecordingBackend)
+        self.assertEqual(len(DecodeRecordingBackend.decodes), 1)
+        self.assertEqual(len(run.results[run.plan.sources[0].path]["psnr"]), 2)
+
+    def test_single_shot_has_no_forced_keyframes(self):
+        run = Run(Plan(segmentation="scenes"), SimulatedBackend({}, latency=0.0, jitter=0.0))
+        source = Source(os.path.join(self.directory, "flat.y4m"))
+        run.segment_plans[source] = {0.0: 4.0}
+        self.assertEqual(run.key_frames(source), "")
+        run.segment_plans[source] = {0.0: 2.5, 2.5: 1.5}
+        self.assertEqual(run.key_frames(source).split(), ["-force_key_frames", "2.5"])
+
+
+if __name__ == "__main__":
+    unittest.main()
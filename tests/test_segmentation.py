@@ -0,0 +1,49 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from dashgen.backends import NativeBackend
+from dashgen.commands import scene_cuts_command
+from dashgen.segmentation import scene_cuts
+
+# the log of a decoding pass whose scene filter selected no frame
+banner = "ffmpeg version 4.4 Copyright (c) 2000-2021 the FFmpeg developers\n" \
+         "Input #0, yuv4mpegpipe, from 'flat.y4m':\n" \
+         "frame=   96 fps=0.0 q=-0.0 Lsize=N/A time=00:00:04.00 bitrate=N/A speed= 120x\n"
+
+
+class SceneCutsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="dashgen_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def detect(self, log, return_code=0):
+        """Scene cuts of a decoding pass made by a stand-in ffmpeg writing ``log`` to stderr."""
+        with open(os.path.join(self.directory, "ffmpeg"), "w") as file:
+            file.write("#!/bin/sh\ncat >&2 <<'EOF'\n%sEOF\nexit %d\n" % (log, return_code))
+        os.chmod(os.path.join(self.directory, "ffmpeg"), 0o755)
+        with mock.patch.dict(os.environ, {"PATH": self.directory + os.pathsep + os.environ["PATH"]}):
+            output = NativeBackend().run("ffmpeg", scene_cuts_command.format(
+                media=self.directory, video_file_name="flat.y4m", threshold=0.4), self.directory, quiet=True)
+        return scene_cuts(output.decode())
+
+    def test_source_without_cuts(self):
+        self.assertEqual(self.detect(banner), [])
+
+    def test_cuts_are_read_from_the_showinfo_lines(self):
+        self.assertEqual(self.detect(banner + "[Parsed_showinfo_1 @ 0x55] n:   0 pts:  98304 pts_time:4       "
+                                              "duration:   512 duration_time:0.0416667 fmt:yuv420p\n"), [4.0])
+
+    def test_ffmpeg_errors_are_not_hidden(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.detect("flat.y4m: No such file or directory\n", 1)
+
+
+if __name__ == "__main__":
+    unittest.main()